@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright 2020 Félix Chénier
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+#     http://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Startup and latency benchmarks for Limited Interaction.
+
+Each public dialog function is called repeatedly in each launch mode, as a
+script would call it, and is answered by cmd.py itself as soon as it is
+shown (using cmd.py's 'autorespond' argument), so that no user is needed.
+For each call, these metrics are measured using the trace spans of the
+dialog (see `li.add_trace_callback`), in seconds:
+
+- spawn: from the call to the start of the process that shows the dialog
+  (or to the reception of the request, for already running processes);
+- tkinter_import: import of tkinter in this process (0 if it was already
+  imported before the call);
+- window_creation: from the reception of the request to the creation of
+  the window, including the creation of the Tk root and the icon;
+- first_mapped: from the call to the first time the window is mapped;
+- first_shown: from the call to the window being shown;
+- result_latency: from the answer to the return of the result, including
+  the wait of the main thread (for message and progress, which return a
+  window at once, to the decoding of the result);
+- total: from the call to the return of the result;
+
+and the peak resident memory of the process that shows the dialog, in kB
+(peak_rss_kb). The first call of each function in each launch mode is
+reported separately as 'cold', since it may include the start of a server.
+
+The file dialogs of the operating system (get_folder and get_filename) are
+not benchmarked, since they cannot be answered synthetically. The preview
+dialog is only benchmarked if NumPy is installed.
+
+The import time of the package is also measured using ``python -X
+importtime``, in a new interpreter for each repetition. The modules that
+must not be imported by ``import limitedinteraction`` (DEFERRED_MODULES)
+are reported, and the benchmark fails if any of them is imported, or if
+the median import time exceeds --max-import-ms.
+
+Usage::
+
+    python benchmarks/run_benchmarks.py --output results.json
+
+On Linux without a display, add --xvfb to run the benchmarks in a virtual X
+server (requires Xvfb).
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import importlib.util
+import statistics
+import subprocess
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import limitedinteraction as li
+
+
+# Arguments of each benchmarked public function, with the synthetic answer.
+# The preview_dialog's image is a black frame of this (height, width, 3).
+FUNCTIONS = {
+    'message': {'message': 'Benchmark', 'autorespond': None},
+    'progress': {'message': 'Benchmark', 'total': 100,
+                 'autorespond': None},
+    'button_dialog': {'message': 'Benchmark', 'choices': ['OK', 'Cancel'],
+                      'autorespond': 0},
+    'input_dialog': {'message': 'Benchmark', 'labels': ['Input'],
+                     'autorespond': 'answer'},
+    'wizard': {'steps': [{'function': 'message', 'message': 'Benchmark'},
+                         {'function': 'button_dialog', 'choices': ['OK']}],
+               'autorespond': [None, 0]},
+    'checklist_dialog': {'message': 'Benchmark',
+                         'choices': [f'Item {i}' for i in range(1000)],
+                         'initial_selection': [0],
+                         'autorespond': [[0, 1]]},
+    'get_filenames': {'initial_folder': '.', 'autorespond': []},
+    'preview_dialog': {'message': 'Benchmark', 'image': (600, 800, 3),
+                       'autorespond': 0},
+}
+
+# Modules that are only imported when a dialog is shown.
+DEFERRED_MODULES = ['limitedinteraction.cmd', 'platform', 'tkinter',
+                    'asyncio', 'matplotlib', 'concurrent', 'logging',
+                    'subprocess', 'heapq']
+
+METRICS = ['spawn', 'tkinter_import', 'window_creation', 'first_mapped',
+           'first_shown', 'result_latency', 'total', 'peak_rss_kb']
+
+
+def run_once(function: str, icon: str = None) -> dict:
+    """
+    Call a public function once in the current launch mode and return metrics.
+
+    The times of each step of the dialog are received as trace spans, which
+    are sent before the function returns.
+    """
+    kwargs = dict(FUNCTIONS[function])
+    if function == 'preview_dialog':
+        import numpy as np
+        kwargs['image'] = np.zeros(kwargs['image'], np.uint8)
+    if icon is not None:
+        kwargs['icon'] = icon
+
+    spans = {}
+    completed = threading.Event()
+
+    def record(span):
+        spans[span['name']] = span
+        if span['name'] == 'dialog':
+            completed.set()
+
+    li.add_trace_callback(record)
+    try:
+        submitted = time.time()
+        getattr(li, function)(**kwargs)
+        returned = time.time()
+        if not completed.wait(60):
+            raise RuntimeError(f'{function} did not complete.')
+        if function in ['message', 'progress']:  # Returned a window at once
+            returned = spans['dialog']['end']
+    finally:
+        li.remove_trace_callback(record)
+
+    metrics = {
+        'spawn': spans['spawn']['end'] - submitted,
+        'tkinter_import': (spans['tkinter_import']['duration']
+                           if 'tkinter_import' in spans else 0.0),
+        'window_creation': (spans['window_creation']['end'] -
+                            spans['root_creation']['start']),
+        'first_mapped': (spans['first_map']['end'] - submitted
+                         if 'first_map' in spans else None),
+        'first_shown': spans['first_paint']['start'] - submitted,
+        'result_latency': returned - spans['user_wait']['end'],
+        'total': returned - submitted,
+        'peak_rss_kb': spans['dialog'].get('peak_rss_kb'),
+    }
+    return metrics
+
+
+def summarize(runs: list) -> dict:
+    """Return the median, min and max of each metric of a list of runs."""
+    summary = {}
+    for metric in METRICS:
+        values = [run[metric] for run in runs if run[metric] is not None]
+        if len(values) > 0:
+            summary[metric] = {'median': statistics.median(values),
+                               'min': min(values),
+                               'max': max(values)}
+    return summary
+
+
+def benchmark(modes: list, functions: list, repeat: int, icon: str) -> dict:
+    """Run the benchmarks and return the results."""
+    results = {}
+    for mode in modes:
+        try:
+            li.set_launch_mode(mode)
+        except ValueError as e:
+            print(f'Skipping {mode}: {e}')
+            continue
+
+        results[mode] = {}
+        for function in functions:
+            if (function == 'preview_dialog' and
+                    importlib.util.find_spec('numpy') is None):
+                print(f'Skipping {function}: NumPy is not installed')
+                continue
+            runs = [run_once(function, icon) for _ in range(repeat + 1)]
+            results[mode][function] = {
+                'cold': runs[0],
+                'warm': summarize(runs[1:]),
+                'runs': runs[1:],
+            }
+            print(f"{mode:>12} {function:>16}: "
+                  f"cold {runs[0]['total'] * 1000:7.1f} ms, "
+                  f"warm {results[mode][function]['warm']['total']['median'] * 1000:7.1f} ms")
+
+    li.set_launch_mode('subprocess')  # Stop the servers
+    return results
+
+
+def import_time(repeat: int) -> dict:
+    """
+    Measure the import time of the package, in seconds.
+
+    Return a dict with the median, min and max of the cumulative import time
+    of limitedinteraction, and the sorted list of the modules that it
+    imported that were not already imported by the interpreter's startup.
+    """
+    package_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=package_path)
+    env.pop('LIMITEDINTERACTION_BACKEND', None)
+
+    durations = []
+    for _ in range(repeat):
+        stderr = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c',
+             'import limitedinteraction'],
+            env=env, stderr=subprocess.PIPE, check=True).stderr.decode()
+
+        # Each line is "import time: self | cumulative | name", where the
+        # name is indented by two spaces per nesting level. Nested modules
+        # are listed before the module that imports them.
+        children = []
+        for line in stderr.splitlines():
+            if not line.startswith('import time:') or 'cumulative' in line:
+                continue
+            _, cumulative, name = line.split('|')
+            if not name.startswith('  '):  # Top-level import
+                if name.strip() == 'limitedinteraction':
+                    durations.append(int(cumulative) / 1e6)
+                    imported = sorted(children)
+                children = []
+            else:
+                children.append(name.strip())
+
+    return {'median': statistics.median(durations),
+            'min': min(durations),
+            'max': max(durations),
+            'imported_modules': imported}
+
+
+def start_xvfb():
+    """Start a virtual X server and return its process."""
+    display = ':99'
+    process = subprocess.Popen(['Xvfb', display, '-screen', '0', '1280x1024x24'],
+                               stdout=subprocess.DEVNULL,
+                               stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1)  # Let Xvfb start
+    return process
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--modes', nargs='+',
+                        default=['subprocess', 'server', 'forkserver'])
+    parser.add_argument('--functions', nargs='+', default=list(FUNCTIONS))
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='Number of warm calls per function and mode.')
+    parser.add_argument('--icon', default='gear',
+                        help="Icon of the dialogs, or 'none'.")
+    parser.add_argument('--output', help='Write the results to this json file.')
+    parser.add_argument('--xvfb', action='store_true',
+                        help='Run in a virtual X server (Linux).')
+    parser.add_argument('--max-import-ms', type=float,
+                        help='Fail if the median import time exceeds this.')
+    parser.add_argument('--import-only', action='store_true',
+                        help='Only run the import time benchmark.')
+    args = parser.parse_args()
+
+    imports = import_time(args.repeat)
+    deferred = [module for module in imports['imported_modules']
+                if module.split('.')[0] in DEFERRED_MODULES
+                or module in DEFERRED_MODULES]
+    print(f"import limitedinteraction: "
+          f"median {imports['median'] * 1000:.1f} ms, "
+          f"{len(imports['imported_modules'])} modules imported")
+    failures = [f'{module} is imported at import time' for module in deferred]
+    if (args.max_import_ms is not None and
+            imports['median'] * 1000 > args.max_import_ms):
+        failures.append(f"import takes more than {args.max_import_ms} ms")
+    for failure in failures:
+        print(f'FAILED: {failure}')
+
+    if args.import_only:
+        sys.exit(1 if failures else 0)
+
+    xvfb = start_xvfb() if args.xvfb else None
+    try:
+        results = benchmark(args.modes, args.functions, args.repeat,
+                            None if args.icon == 'none' else args.icon)
+    finally:
+        if xvfb is not None:
+            xvfb.terminate()
+
+    report = {
+        'limitedinteraction_version': open(os.path.dirname(li.__file__) +
+                                           '/VERSION').read().strip(),
+        'python': sys.version,
+        'platform': platform.platform(),
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'import_time': imports,
+        'results': results,
+    }
+
+    if args.output is not None:
+        with open(args.output, 'w') as fid:
+            json.dump(report, fid, indent=2)
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,9 +21,10 @@ Limited Interaction
 Provides simple, backend-independant GUI tools for limited user interaction.
 
 This module provides simple GUI tools that run in their own process, so that
-it cannot conflict with the current running event loop. If Matplotlib is
-imported, it updates its event loop in background while waiting for user
-action.
+it cannot conflict with the current running event loop. If Matplotlib, Qt,
+Tk or an IPython GUI input hook is in use, their event loops keep running
+while waiting for user action. Other event loops can be added using
+`register_event_loop`.
 
 Additional parameters
 ---------------------
@@ -54,6 +55,108 @@ min_width
 min_height
     Minimal width of the dialog window in pixels.
 
+Non-blocking dialogs
+--------------------
+All functions except `message` also accept this parameter:
+
+blocking
+    Optional. Default is True. If False, the function returns immediately a
+    concurrent.futures.Future, while the dialog stays open. Its result,
+    obtained using ``result(timeout=...)`` or ``add_done_callback``, is the
+    value that the function would have returned. Cancelling the Future
+    closes the dialog window.
+
+Timeouts
+--------
+All functions except `message` and `progress` also accept these parameters:
+
+timeout
+    Optional. Default is None. If the user did not answer after this number
+    of seconds, the window is closed and the default value is returned.
+default
+    Optional. The value to return after the timeout. By default, this is the
+    value returned when the user closes the window (e.g., -1 for
+    `button_dialog`). In the 'headless' launch mode, it is also the default
+    answer.
+countdown
+    Optional. Default is False. If True, the dialog shows the remaining time
+    before it is closed.
+
+Remembering answers
+-------------------
+All functions except `message`, `progress`, `get_folder` and `get_filename`
+(which use the system's file dialogs) also accept this parameter:
+
+remember
+    Optional. A str that identifies this question in the script, e.g.,
+    'filter_data'. A "Remember my answer" check box is shown under the
+    dialog, and if it is checked, the next calls with the same remember
+    key, message and choices (or labels) return this answer immediately,
+    without showing any window, for 30 days (see `set_answer_store`).
+    Answers are forgotten using `forget_answers`. Not available for masked
+    inputs, and ignored in the 'headless' launch mode.
+
+Concurrent dialogs
+------------------
+Dialogs can be called from several threads at once. By default, they are
+all shown immediately, each window being offset from the windows already
+open. Only the blocking dialogs called from the main thread keep the event
+loops of Matplotlib, Qt or Tk running while waiting, since these toolkits
+can't be driven from other threads: while a worker thread waits for a
+dialog, the host GUI stays responsive only if the main thread runs its
+event loop. All functions except `message` and `progress` also accept this
+parameter:
+
+priority
+    Optional. Default is 0. When the number of dialogs shown at the same
+    time is limited using `set_dialog_scheduler`, the waiting dialogs with
+    the highest priority are shown first.
+
+Worker processes
+----------------
+Dialogs called by worker processes (e.g., multiprocessing.Pool or
+concurrent.futures.ProcessPoolExecutor) can be forwarded to the parent
+process using `start_broker`, so that identical questions asked by several
+workers at once are shown in a single window.
+
+Launch modes
+------------
+By default, each dialog is shown by a new python process, which imports
+tkinter and creates its own Tk root. Scripts that show many dialogs can use
+`set_launch_mode` to select another launch mode. The 'remote' launch mode
+shows the dialogs on another computer, where a dialog daemon was started
+using `start_daemon`. It can also be selected using these environment
+variables:
+
+LIMITEDINTERACTION_BACKEND
+    'remote'.
+LIMITEDINTERACTION_REMOTE
+    The daemon's address, e.g., 'workstation.lab:6000'.
+LIMITEDINTERACTION_AUTHKEY
+    The daemon's key.
+
+Headless mode
+-------------
+For unattended runs (batch pipelines, continuous integration, compute nodes
+without a display), the 'headless' launch mode answers every dialog
+in-process, without starting any process or importing tkinter. The answers
+are taken in order from a queue filled using `queue_responses`, or from a
+json file that contains a list of answers. When no answer is queued, each
+dialog returns its default answer: the first button for `button_dialog`, the
+initial values for `input_dialog`, the initial selection for
+`checklist_dialog`, the initial folder for `get_folder`, '' (cancelled)
+for `get_filename` and [] (cancelled) for `get_filenames`.
+
+This mode can also be selected without modifying the script, using these
+environment variables:
+
+LIMITEDINTERACTION_BACKEND
+    'headless' to start in headless mode. Any other launch mode can also be
+    selected this way.
+LIMITEDINTERACTION_RESPONSES
+    Path to a json file with the list of answers to queue, read on the first
+    headless dialog.
+
 """
 
 __author__ = "Félix Chénier"
@@ -65,143 +168,2423 @@ __license__ = "Apache 2.0"
 import os
 import sys
 import json
-import platform
 import time
-from threading import Thread
-import subprocess
-import warnings
+import itertools
+import collections
+import array
+from threading import Thread, Lock, Event, Timer, current_thread, main_thread
 from typing import Sequence, Union, List
-import limitedinteraction.cmd as cmd
 
+# Nothing else is done at import: the platform, the temporary folder and
+# cmd.py are only looked up when first needed, so that importing this module
+# costs nearly nothing for scripts that never show a dialog.
+my_path = os.path.dirname(os.path.abspath(__file__))
+_cmd_path = os.path.join(my_path, 'cmd.py')
+
+
+def _system() -> str:
+    """Return platform.system(), detected on the first call."""
+    if _constants['system'] is None:
+        import platform
+        _constants['system'] = platform.system()
+    return _constants['system']
+
+
+# Temporary folder
+def _try_folder(folder: str) -> bool:
+    """Try this folder for write access as a temporary folder."""
+    try:
+        os.mkdir(folder)
+    except FileExistsError:
+        pass
+    except Exception:
+        return False
+
+    return True
+
+
+def _get_temp_folder() -> str:
+    """Return the temporary folder, created on the first call."""
+    if _constants['temp_folder'] is None:
+        try_list = []
+
+        if _system() == 'Windows' and "TEMP" in os.environ:
+            try_list.append(os.environ["TEMP"] + "/limitedinteraction")
+        if _system() == 'Darwin' and "TMPDIR" in os.environ:
+            try_list.append(os.environ["TMPDIR"] + "/limitedinteraction")
+        if "HOME" in os.environ:
+            try_list.append(os.environ["HOME"] + "/.limitedinteraction")
+        # Last try
+        try_list.append(".")
+
+        for temp_folder in try_list:
+            if _try_folder(temp_folder):
+                break
+
+        if temp_folder == ".":
+            import warnings
+            warnings.warn("Could not set temporary folder.")
+
+        _constants['temp_folder'] = temp_folder
+
+    return _constants['temp_folder']
+
+
+def __getattr__(name: str):
+    """Compute the deferred module attributes on first access."""
+    if name == 'is_pc':
+        return _system() == 'Windows'
+    elif name == 'is_mac':
+        return _system() == 'Darwin'
+    elif name == 'is_linux':
+        return _system() == 'Linux'
+    elif name == '_temp_folder':
+        return _get_temp_folder()
+    elif name == 'cmd':
+        import limitedinteraction.cmd as cmd
+        return cmd
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+
+
+# Set some state variables
+_message_windows = []  # type: list  # Open message windows
+_message_lock = Lock()  # Held while a message window replaces the others
+_constants = {'system': None, 'temp_folder': None}  # Detected when needed
+_launch_mode = ['subprocess']
+_max_command_line_arguments = 8000  # Longer arguments are passed on stdin
+_event_loop_slice = 0.2  # Max seconds of host event loop between checks
+_waiting_function = [None]  # (key, wait), see _define_waiting_function
+_closed_values = {  # Value returned by each function if its window is closed
+    'button_dialog': -1,
+    'preview_dialog': -1,
+    'input_dialog': -1,
+    'checklist_dialog': -1,
+    'get_folder': '',
+    'get_filename': '',
+    'get_filenames': [],
+    'wizard': -1,
+}
+_answer_store = {'max_entries': 1000,  # See set_answer_store
+                 'max_age': 30 * 24 * 3600,
+                 'answers': None,  # Loaded on first use
+                 'lock': Lock()}
+_listing_cache = {'on_disk': False,  # See set_listing_cache
+                  'max_entries': 1000000,
+                  'max_disk_size': 100 * 1024 * 1024}
+_scheduler = {'max_dialogs': None,  # See set_dialog_scheduler
+              'cascade': True,
+              'lock': Lock(),
+              'slots': set(),  # Slots of the open dialogs, see _acquire_slot
+              'queue': [],  # Heap of (-priority, order, Future of a slot)
+              'order': itertools.count()}
+_remote = {'address': None,  # Daemon of the 'remote' launch mode
+           'authkey': None,
+           'daemon': None}  # Daemon process started by start_daemon
+_broker = {'server': None,  # Broker of this process, see start_broker
+           'client': None,  # Connection to the broker of a parent process
+           'lock': Lock()}
+_servers = {}  # type: dict  # Running dialog servers, by launch mode
+_trace_callbacks = []  # type: list  # Functions that receive the spans
+_trace_file = [None]  # Trace callback that writes to the trace file
+_trace_dialog_ids = itertools.count(1)
+_headless_responses = collections.deque()  # Queued answers, in order
+_headless_file_read = [False]  # LIMITEDINTERACTION_RESPONSES already read
+
+
+def _set_result(future: 'Future', result) -> None:
+    """Set the result of a Future, unless it has been cancelled meanwhile."""
+    try:
+        future.set_result(result)
+    except Exception:  # InvalidStateError, the future has been cancelled.
+        pass
+
+
+def add_trace_callback(callback) -> None:
+    """
+    Register a function that receives the timed spans of every dialog.
+
+    Once at least one function is registered, each dialog records the time
+    of each of its steps, and once it is completed, the registered functions
+    are called with each of its spans as a dict::
+
+        {'name': 'spawn',  # Name of the span
+         'function': 'button_dialog',  # Dialog function
+         'dialog': 3,  # Number of the dialog, to group its spans
+         'launch_mode': 'subprocess',
+         'start': 1700000000.1,  # time.time() at the start of the span
+         'end': 1700000000.2,  # time.time() at the end of the span
+         'duration': 0.1}  # In seconds
+
+    The span names are, in order:
+
+    - 'spawn': start of the process (or reception of the request by an
+      already running process);
+    - 'tkinter_import': import of tkinter (only for new processes);
+    - 'root_creation': creation of the Tk root or Toplevel window;
+    - 'icon_load': loading of the icon (only if there is an icon);
+    - 'window_creation': composition of the dialog window;
+    - 'place_window': calculation of the window's size and position;
+    - 'first_paint': from showing the window to its first idle time;
+    - 'first_map': from the call to the first time the window is mapped;
+    - 'user_wait': from the first paint to the user's answer;
+    - 'output': transfer of the answer to this process;
+    - 'json_decode': decoding of the answer;
+    - 'dialog': whole dialog, from the call to the decoded answer. This
+      span also has the peak resident memory of the process that showed the
+      dialog in kB, as 'peak_rss_kb', when it is available.
+
+    The callback is called from a background thread and should be quick.
+    Without registered callbacks, the cost of this instrumentation is a
+    single test per dialog.
+
+    Parameters
+    ----------
+    callback
+        A function that takes the span dict as its only argument.
+
+    Returns
+    -------
+    None
+
+    """
+    _trace_callbacks.append(callback)
+
+
+def remove_trace_callback(callback) -> None:
+    """
+    Unregister a function registered using `add_trace_callback`.
+
+    Parameters
+    ----------
+    callback
+        The function to unregister.
+
+    Returns
+    -------
+    None
+
+    """
+    _trace_callbacks.remove(callback)
+
+
+def set_trace_file(filename: Union[str, None]) -> None:
+    """
+    Write the timed spans of every dialog to a trace file.
+
+    Each span, as described in `add_trace_callback`, is appended to the file
+    as a json line.
+
+    Parameters
+    ----------
+    filename
+        The trace file. Use None to stop writing to the trace file.
+
+    Returns
+    -------
+    None
+
+    """
+    if _trace_file[0] is not None:
+        remove_trace_callback(_trace_file[0])
+        _trace_file[0] = None
+
+    if filename is None:
+        return
+
+    lock = Lock()
+
+    def write_span(span):
+        with lock:
+            with open(filename, 'a') as fid:
+                fid.write(json.dumps(span) + '\n')
+
+    _trace_file[0] = write_span
+    add_trace_callback(write_span)
+
+
+def _record_output_times(output, output_received: float,
+                         traced=None) -> None:
+    """
+    Add the reception and decoding times to a timed output.
+
+    traced is the tuple (function, submitted) of a traced dialog, whose spans
+    are then sent to the trace callbacks. This is done before the output is
+    handed to the caller, so that the spans are available once the dialog
+    returns.
+    """
+    if isinstance(output, list) and len(output) > 2 and 'timing' in output[2]:
+        output[2]['timing']['output_received'] = output_received
+        output[2]['timing']['decoded'] = time.time()
+        if traced is not None:
+            _trace(traced[0], traced[1], output)
+
+
+def _trace(function: str, submitted: float, output: list) -> None:
+    """Send the spans of a completed dialog to the trace callbacks."""
+    timing = dict(output[2]['timing'], submitted=submitted)
+
+    if timing['start'] >= submitted:  # New process
+        steps = [('spawn', 'submitted', 'start'),
+                 ('tkinter_import', 'start', 'tkinter_imported')]
+    else:  # Already running process
+        steps = [('spawn', 'submitted', 'received')]
+    steps += [('root_creation', 'received', 'root_created'),
+              ('icon_load', 'icon_loading', 'icon_loaded'),
+              ('window_creation', 'root_created', 'window_created'),
+              ('place_window', 'placing', 'placed'),
+              ('first_paint', 'shown', 'painted'),
+              ('first_map', 'submitted', 'mapped'),
+              ('user_wait', 'painted', 'answered'),
+              ('output', 'answered', 'output_received'),
+              ('json_decode', 'output_received', 'decoded'),
+              ('dialog', 'submitted', 'decoded')]
+
+    dialog = next(_trace_dialog_ids)
+    for name, start, end in steps:
+        if start in timing and end in timing:
+            span = {
+                'name': name,
+                'function': function,
+                'dialog': dialog,
+                'launch_mode': _launch_mode[0],
+                'start': timing[start],
+                'end': timing[end],
+                'duration': timing[end] - timing[start],
+            }
+            if name == 'dialog' and 'peak_rss_kb' in timing:
+                span['peak_rss_kb'] = timing['peak_rss_kb']
+            for callback in list(_trace_callbacks):
+                callback(span)
+
+
+class _DialogServer:
+    """
+    Persistent cmd.py process that serves dialog requests over a pipe.
+
+    Requests are written as json lines on the process' stdin and results are
+    read as json lines from its stdout, by a reader thread that sets them as
+    the result of the Future of each request. The process is restarted
+    automatically on the next request if it died.
+    """
+
+    def __init__(self, function: str = 'server'):
+        self.function = function
+        self.pid = os.getpid()  # Forked processes must start their own
+        self.process = None
+        self.lock = Lock()
+        self.pending = {}  # type: dict  # id -> (Future, process)
+        self.request_ids = itertools.count(1)
+
+    def _start(self):
+        """Start the server process and its reader thread."""
+        import subprocess
+        self.process = subprocess.Popen(
+            [sys.executable, _cmd_path,
+             json.dumps({'function': self.function})],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        Thread(target=self._read, args=(self.process,), daemon=True).start()
+
+    def _responses(self, process):
+        """Yield the responses of a process until it stops."""
+        for line in process.stdout:
+            try:
+                yield json.loads(line.decode())
+            except ValueError:  # E.g., a warning printed by Tcl or a library
+                continue
+
+    def _alive(self) -> bool:
+        """Return True if the server runs. Must be called with the lock."""
+        return self.process is not None and self.process.poll() is None
+
+    def _read(self, process):
+        """Dispatch the results of a process to the waiting callers."""
+        try:
+            for response in self._responses(process):
+                output_received = time.time()
+                if not isinstance(response, dict) or 'id' not in response:
+                    continue  # Not a response
+                with self.lock:
+                    waiter = self.pending.pop(response['id'], None)
+                if waiter is not None:
+                    _record_output_times(response['output'], output_received,
+                                         getattr(waiter[0], 'traced', None))
+                    _set_result(waiter[0], response['output'])
+        finally:
+            # Whatever happened, don't leave anyone waiting forever.
+            self._stopped(process)
+
+    def _stopped(self, process):
+        """Release everyone still waiting on a process that stopped."""
+        with self.lock:
+            if self.process is process:
+                self.process = None
+            dead = [request_id for request_id in self.pending
+                    if self.pending[request_id][1] is process]
+            waiters = [self.pending.pop(request_id) for request_id in dead]
+        for waiter in waiters:
+            _set_result(waiter[0], ['RuntimeError',
+                                    'The dialog server stopped unexpectedly.'])
+
+    def _send(self, message: dict) -> bool:
+        """Write a message to the server. Must be called with the lock."""
+        try:
+            self.process.stdin.write((json.dumps(message) + '\n').encode())
+            self.process.stdin.flush()
+            return True
+        except (OSError, AttributeError):  # Dead or stopped server
+            return False
+
+    def request(self, kwargs: dict):
+        """
+        Send a request to the server.
+
+        Return a tuple (request_id, future). The future's result is set to
+        the output [returnval, contents] once the server answered.
+        """
+        from concurrent.futures import Future
+        future = Future()
+        if 'timing' in kwargs and _trace_callbacks:
+            future.traced = (kwargs['function'], time.time())
+        with self.lock:
+            if not self._alive():
+                try:
+                    self._start()
+                except OSError as e:
+                    future.set_result(['RuntimeError',
+                                       f'Cannot start the dialog server: {e}'])
+                    return (0, future)
+            request_id = next(self.request_ids)
+            self.pending[request_id] = (future, self.process)
+            if not self._send(dict(kwargs, id=request_id)):
+                self.pending.pop(request_id, None)
+                future.set_result(['RuntimeError',
+                                   'The dialog server stopped unexpectedly.'])
+
+        return (request_id, future)
+
+    def close(self, request_id: int):
+        """Close the window of a request, without waiting for its output."""
+        with self.lock:
+            self.pending.pop(request_id, None)
+            if self.process is not None:
+                self._send({'close': request_id})
+
+    def update(self, request_id: int, update: dict):
+        """Send an update (e.g., {'message': 'new text'}) to a window."""
+        with self.lock:
+            if self.process is not None:
+                self._send(dict(update, update=request_id))
+
+    def stop(self):
+        """Stop the server by closing its stdin."""
+        with self.lock:
+            if self.process is not None:
+                try:
+                    self.process.stdin.close()
+                except OSError:
+                    pass
+                self.process = None
+
+
+class _DialogConnection(_DialogServer):
+    """
+    Connection to a dialog broker or daemon, as a `_DialogServer`.
+
+    Requests, controls and results are the same json messages as for
+    cmd.py's server, sent using multiprocessing.connection's send_bytes
+    (never pickled, since the daemon may be on another computer). Many
+    requests can be pending on the same connection. If the connection is
+    lost, it is opened again and the pending requests are sent again. If
+    this fails, the pending requests fail and the connection is opened
+    again on the next request.
+    """
+
+    #: Seconds to wait before each attempt to reconnect.
+    reconnect_delays = (0.1, 0.5, 1, 2, 4)
+
+    def __init__(self, address, authkey: bytes):
+        super().__init__()
+        self.address = address
+        self.authkey = authkey
+        self.requests = {}  # type: dict  # id -> request, until answered
+
+    def _connect(self):
+        """Return a new connection, or raise ConnectionError."""
+        from multiprocessing import AuthenticationError
+        from multiprocessing.connection import Client
+        try:
+            return Client(self.address, authkey=self.authkey)
+        except (EOFError, AuthenticationError) as e:
+            raise ConnectionError(f'Connection refused by {self.address}: {e}')
+
+    def _start(self):
+        """Connect and start the reader thread."""
+        self.process = self._connect()
+        Thread(target=self._read, args=(self.process,), daemon=True).start()
+
+    def _responses(self, connection):
+        """Yield the responses received until the connection is lost."""
+        while True:
+            try:
+                response = json.loads(connection.recv_bytes().decode())
+            except (EOFError, OSError, ValueError):
+                connection.close()  # So that _alive is False
+                return
+            with self.lock:
+                self.requests.pop(response['id'], None)
+            yield response
+
+    def _stopped(self, connection):
+        """Reconnect and send the pending requests again, if possible."""
+        for delay in self.reconnect_delays:
+            time.sleep(delay)
+            with self.lock:
+                if self.process is None:  # Stopped
+                    break
+                if self.process is connection:
+                    try:
+                        self._start()
+                    except OSError:
+                        continue
+                # Else, a new request already reconnected.
+                for request_id, waiter in list(self.pending.items()):
+                    if waiter[1] is connection:
+                        self.pending[request_id] = (waiter[0], self.process)
+                        self._send(self.requests[request_id])
+                return
+
+        super()._stopped(connection)
+        with self.lock:
+            for request_id in list(self.requests):
+                if request_id not in self.pending:
+                    del self.requests[request_id]
+
+    def _alive(self) -> bool:
+        """Return True if connected. Must be called with the lock."""
+        return self.process is not None and not self.process.closed
+
+    def _send(self, message: dict) -> bool:
+        """Send a message. Must be called with the lock."""
+        if 'function' in message:  # Kept to be sent again on reconnection
+            self.requests[message['id']] = message
+        elif 'close' in message:
+            self.requests.pop(message['close'], None)
+        try:
+            self.process.send_bytes(json.dumps(message).encode())
+            return True
+        except (OSError, AttributeError):  # Lost or closed connection
+            return False
+
+    def stop(self):
+        """Close the connection."""
+        with self.lock:
+            if self.process is not None:
+                self.process.close()
+                self.process = None
+
+
+class _DialogBroker:
+    """
+    Serve the dialogs requested by worker processes in this process.
+
+    Each worker connection is served by its own thread. Dialogs are shown
+    using this process' launch mode and scheduler. Identical dialogs
+    requested by several workers while the first one is still open share
+    the same window, and its answer is sent to every worker that asked.
+    """
+
+    def __init__(self, address=None, authkey: bytes = None):
+        from multiprocessing.connection import Listener
+        # Authenticated by _serve, in the thread of each connection.
+        self.listener = Listener(address)
+        self.authkey = authkey
+        self.lock = Lock()
+        self.pending = {}  # type: dict  # key -> (Future, [(send, id), ...])
+        Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        """Accept the worker connections until the listener is closed."""
+        while True:
+            try:
+                connection = self.listener.accept()
+            except OSError:  # Closed listener
+                return
+            Thread(target=self._serve, args=(connection,),
+                   daemon=True).start()
+
+    def _serve(self, connection):
+        """Serve the requests of a worker connection until it is closed."""
+        from multiprocessing.connection import (
+            deliver_challenge, answer_challenge)
+        try:
+            deliver_challenge(connection, self.authkey)
+            answer_challenge(connection, self.authkey)
+        except Exception:  # Failed authentication or lost worker
+            connection.close()
+            return
+
+        send_lock = Lock()
+        windows = {}  # type: dict  # id -> (key or None, Future, send)
+
+        def reply(request_id, output):
+            with send_lock:
+                try:
+                    connection.send_bytes(json.dumps(
+                        {'id': request_id, 'output': output}).encode())
+                except OSError:  # The worker is gone
+                    pass
+
+        while True:
+            try:
+                request = json.loads(connection.recv_bytes().decode())
+            except (EOFError, OSError, ValueError):
+                break
+            if 'close' in request:
+                if request['close'] in windows:
+                    self._leave(reply, request['close'],
+                                *windows.pop(request['close']))
+            elif 'update' in request:
+                if request['update'] in windows:
+                    windows[request['update']][2]({
+                        key: value for key, value in request.items()
+                        if key != 'update'})
+            else:
+                request_id = request.pop('id')
+                windows[request_id] = self._join(reply, request_id, request)
+
+        # Close the windows of a lost worker
+        for request_id in windows:
+            self._leave(reply, request_id, *windows[request_id])
+        connection.close()
+
+    def _join(self, reply, request_id: int, kwargs: dict):
+        """
+        Show a dialog, or join the identical dialog that is already open.
+
+        Return a tuple (key, future, send), where key is None for the
+        message and progress windows, which are never shared. The dialog is
+        scheduled with the priority of the worker that asked first.
+        """
+        priority = kwargs.pop('priority', 0)
+        if kwargs['function'] in ['message', 'progress']:
+            future, send = _submit(kwargs)
+            future.add_done_callback(
+                lambda future: None if future.cancelled() else
+                reply(request_id, future.result()))
+            return (None, future, send)
+
+        key = json.dumps({key: value for key, value in kwargs.items()
+                          if key != 'timing'}, sort_keys=True)
+        with self.lock:
+            if key in self.pending:
+                self.pending[key][1].append((reply, request_id))
+                return (key, self.pending[key][0], lambda update: None)
+            future = _schedule(kwargs, priority)
+            self.pending[key] = (future, [(reply, request_id)])
+
+        def fan_out(future):
+            with self.lock:
+                waiters = self.pending.pop(key, (None, []))[1]
+            if not future.cancelled():
+                for waiter_reply, waiter_id in waiters:
+                    waiter_reply(waiter_id, future.result())
+
+        future.add_done_callback(fan_out)
+        return (key, future, lambda update: None)
+
+    def _leave(self, reply, request_id: int, key, future: 'Future', send):
+        """Stop waiting for a dialog, and close it if nobody else waits."""
+        if key is None:
+            future.cancel()
+            return
+        with self.lock:
+            if key not in self.pending or self.pending[key][0] is not future:
+                return  # Already answered
+            waiters = self.pending[key][1]
+            waiters.remove((reply, request_id))
+            close = len(waiters) == 0
+        if close:
+            future.cancel()
+
+    def stop(self):
+        """Stop accepting new connections."""
+        self.listener.close()
+
+
+def start_broker(address=None, authkey: bytes = None) -> None:
+    """
+    Show the dialogs of worker processes in this process.
+
+    Once the broker is started, the dialogs called by the worker processes
+    started afterwards (e.g., by multiprocessing.Pool or
+    concurrent.futures.ProcessPoolExecutor) are forwarded to this process,
+    which shows them using its own launch mode and scheduler (see
+    `set_dialog_scheduler`). When several workers ask the same question
+    while its window is open, a single window is shown and its answer is
+    returned to every worker that asked.
+
+    The workers find the broker using the LIMITEDINTERACTION_BROKER
+    environment variable, which is set by this function and inherited by
+    the child processes.
+
+    Parameters
+    ----------
+    address
+        Optional. The address to listen on, as accepted by
+        multiprocessing.connection.Listener. Default is None (a new local
+        address).
+    authkey
+        Optional. The key that workers must use to connect. Default is None
+        (a new random key).
+
+    Returns
+    -------
+    None
+
+    """
+    stop_broker()
+    if authkey is None:
+        authkey = os.urandom(32)
+    _broker['server'] = _DialogBroker(address, authkey)
+    os.environ['LIMITEDINTERACTION_BROKER'] = json.dumps({
+        'address': _broker['server'].listener.address,
+        'authkey': authkey.hex(),
+        'pid': os.getpid()})
+
+
+def stop_broker() -> None:
+    """
+    Stop forwarding the dialogs of new worker processes to this process.
+
+    Returns
+    -------
+    None
+
+    """
+    if _broker['server'] is not None:
+        _broker['server'].stop()
+        _broker['server'] = None
+    os.environ.pop('LIMITEDINTERACTION_BROKER', None)
+
+
+def _get_broker_client() -> Union[_DialogConnection, None]:
+    """
+    Return the client of the broker that serves this process, if any.
+
+    This is None if no broker has been started by a parent process, or if
+    this process is the broker.
+    """
+    if 'LIMITEDINTERACTION_BROKER' not in os.environ:
+        return None
+    client = _broker['client']
+    if client is not None and client.pid == os.getpid():
+        return client
+
+    info = json.loads(os.environ['LIMITEDINTERACTION_BROKER'])
+    if info['pid'] == os.getpid():
+        return None
+    with _broker['lock']:
+        if _broker['client'] is client:  # Not created by another thread
+            address = info['address']
+            if isinstance(address, list):  # (host, port), through json
+                address = tuple(address)
+            _broker['client'] = _DialogConnection(
+                address, bytes.fromhex(info['authkey']))
+    return _broker['client']
+
+
+def set_launch_mode(mode: str, address=None,
+                    authkey: Union[bytes, str, None] = None) -> None:
+    """
+    Set how the dialog windows are launched.
+
+    Parameters
+    ----------
+    mode
+        - 'subprocess' (default): each dialog is shown by a new python
+          process. This is the most robust mode, but each dialog costs a
+          python interpreter startup, a tkinter import and a Tk root creation.
+        - 'server': all dialogs are shown by a single persistent python
+          process that is started on the first dialog, which makes the
+          subsequent dialogs much faster to appear. This process is
+          restarted automatically if it dies.
+        - 'forkserver': each dialog is shown by its own process, but this
+          process is forked from a persistent process that has already
+          imported tkinter and loaded the icons. This keeps the isolation of
+          the 'subprocess' mode, while the dialogs appear faster. Not
+          available on Windows and macOS.
+        - 'headless': no window is shown. Each dialog is answered
+          in-process using the answers queued by `queue_responses`, or its
+          default answer. Consult the module's help for more information.
+        - 'remote': the dialogs are shown by a dialog daemon started using
+          `start_daemon`, possibly on another computer. Many dialogs can be
+          pending on the same connection, and the connection is opened
+          again if it is lost.
+    address
+        Required for the 'remote' launch mode: the daemon's address, as a
+        'host:port' str, a (host, port) tuple, or a UNIX socket path.
+        Default is the LIMITEDINTERACTION_REMOTE environment variable.
+    authkey
+        Required for the 'remote' launch mode: the daemon's key, as bytes
+        or as a str. Default is the LIMITEDINTERACTION_AUTHKEY environment
+        variable.
+
+    Returns
+    -------
+    None
+
+    """
+    if mode not in ['subprocess', 'server', 'forkserver', 'headless',
+                    'remote']:
+        raise ValueError(f"Unknown launch mode '{mode}'.")
+    if mode == 'forkserver' and _system() in ['Windows', 'Darwin']:
+        raise ValueError(
+            "The 'forkserver' launch mode is not available on this platform.")
+    if mode == 'remote':
+        if address is None:
+            address = os.environ.get('LIMITEDINTERACTION_REMOTE')
+        if authkey is None:
+            authkey = os.environ.get('LIMITEDINTERACTION_AUTHKEY')
+        if address is None or authkey is None:
+            raise ValueError(
+                "The 'remote' launch mode requires an address and an authkey.")
+        _remote['address'] = _parse_address(address)
+        _remote['authkey'] = (authkey.encode() if isinstance(authkey, str)
+                              else authkey)
+
+    # Stop the servers that we won't use anymore.
+    for server_mode in list(_servers):
+        if server_mode != mode or mode == 'remote':
+            _servers.pop(server_mode).stop()
+
+    _launch_mode[0] = mode
+
+
+def _parse_address(address):
+    """Return a connection address from a 'host:port' str or a tuple."""
+    if isinstance(address, str):
+        host, _, port = address.rpartition(':')
+        if host != '' and port.isdigit():
+            return (host, int(port))
+        return address  # UNIX socket or Windows pipe
+    return tuple(address)
+
+
+def start_daemon(address=None,
+                 authkey: Union[bytes, str, None] = None) -> tuple:
+    """
+    Start a dialog daemon that shows the dialogs of other processes.
+
+    The daemon shows the dialogs requested by the processes that use the
+    'remote' launch mode (see `set_launch_mode`) with its address and key,
+    e.g., by jobs running on a compute node without a display, while this
+    computer is the operator's workstation. The daemon runs until this
+    python session ends or until `stop_daemon` is called.
+
+    Parameters
+    ----------
+    address
+        Optional. The address to listen on, as a 'host:port' str, a (host,
+        port) tuple, or a UNIX socket path. Use port 0 to let the system
+        choose a free port. Default is None (a new local address).
+    authkey
+        Optional. The key that the clients must use to connect, as bytes or
+        as a str. Default is None (a new random key).
+
+    Returns
+    -------
+    tuple
+        The address listened on and the authkey, as (address, authkey).
+
+    """
+    import subprocess
+    stop_daemon()
+    if address is not None:
+        address = _parse_address(address)
+    if authkey is None:
+        authkey = os.urandom(32)
+    elif isinstance(authkey, str):
+        authkey = authkey.encode()
+
+    kwargs = {'function': 'daemon', 'address': address,
+              'authkey': authkey.hex()}
+    # The arguments are always passed on stdin, to hide the key.
+    process = subprocess.Popen([sys.executable, _cmd_path, '-'],
+                               stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.DEVNULL)
+    process.stdin.write((json.dumps(kwargs) + '\n').encode())
+    process.stdin.flush()
+    try:
+        output = json.loads(process.stdout.readline().decode())
+    except ValueError:
+        output = ['RuntimeError', 'The dialog daemon stopped unexpectedly.']
+    if isinstance(output, list):  # Error returned by cmd.py
+        process.kill()
+        _unpack_output(output)
+
+    _remote['daemon'] = process
+    listened = output['address']
+    if isinstance(listened, list):  # (host, port), through json
+        listened = tuple(listened)
+    return (listened, authkey)
+
+
+def stop_daemon() -> None:
+    """
+    Stop the dialog daemon started by `start_daemon`.
+
+    Returns
+    -------
+    None
+
+    """
+    import subprocess
+    process = _remote['daemon']
+    if process is not None:
+        _remote['daemon'] = None
+        try:
+            process.stdin.close()  # The daemon quits when stdin is closed
+            process.wait(5)
+        except (OSError, subprocess.TimeoutExpired):
+            process.kill()
+        process.stdout.close()
+
+
+def queue_responses(responses: Sequence) -> None:
+    """
+    Queue answers for the dialogs shown in the 'headless' launch mode.
+
+    Each headless dialog, except `message` and `progress` which do not
+    return anything, takes the next queued answer and returns it as if the
+    user answered it. A queued answer of -1 behaves like a closed window.
+
+    Parameters
+    ----------
+    responses
+        The answers, in order. For example, [1, 'John', -1] answers a
+        button_dialog with the second button, then an input_dialog with
+        'John', then closes the next dialog.
+
+    Returns
+    -------
+    None
+
+    """
+    _headless_responses.extend(responses)
+
+
+def _headless_output(kwargs: dict) -> list:
+    """
+    Answer a dialog in the 'headless' launch mode.
+
+    Validate the arguments as cmd.py would, then return cmd.py's output
+    [returnval, contents] with the next queued answer, or with the dialog's
+    default answer if no answer is queued. A queued answer that this dialog
+    could not return (e.g., a str for `button_dialog`, or a button index out
+    of range) returns a ValueError instead.
+    """
+    if not _headless_file_read[0]:
+        _headless_file_read[0] = True
+        if 'LIMITEDINTERACTION_RESPONSES' in os.environ:
+            with open(os.environ['LIMITEDINTERACTION_RESPONSES'], 'r') as fid:
+                queue_responses(json.load(fid))
+
+    function = kwargs['function']
+    if 'left' in kwargs and 'right' in kwargs:
+        return ['ValueError', "'left' and 'right' cannot be both specified."]
+    if 'top' in kwargs and 'bottom' in kwargs:
+        return ['ValueError', "'top' and 'bottom' cannot be both specified."]
+
+    from .cmd import input_fields, wizard_step_functions
+
+    def default_answer(step):
+        """Return the default answer of a dialog or a wizard step."""
+        if step['function'] in ['button_dialog', 'preview_dialog']:
+            return 0
+        elif step['function'] == 'input_dialog':
+            labels, initial_values, masked = input_fields(**step)
+            initial_values = [str(value) for value in initial_values]
+            return initial_values[0] if len(labels) == 1 else initial_values
+        elif step['function'] == 'checklist_dialog':
+            return step.get('initial_selection', [])
+        elif step['function'] == 'get_folder':
+            return os.path.abspath(step.get('initial_folder', '.'))
+        elif step['function'] == 'get_filename':
+            return ''
+        elif step['function'] == 'get_filenames':
+            return []
+        elif step['function'] == 'message':
+            return None
+        else:
+            raise KeyError(step['function'])
+
+    try:
+        if function == 'wizard':
+            for step in kwargs['steps']:
+                if step['function'] not in wizard_step_functions:
+                    raise KeyError(step['function'])
+            default = [default_answer(step) for step in kwargs['steps']]
+        else:
+            default = default_answer(kwargs)
+    except ValueError as e:  # Raised by input_fields
+        return ['ValueError', str(e)]
+    except KeyError as e:
+        if function == 'wizard':
+            return ['ValueError',
+                    f"Unknown wizard step function '{e.args[0]}'."]
+        return ['ValueError', f"Unknown function '{e.args[0]}'."]
+
+    if 'default' in kwargs:  # Explicit default answer
+        default = kwargs['default']
+        if function == 'checklist_dialog' and default != -1:
+            default = _to_ranges(default)  # As returned by cmd.py
+
+    def check_answer(step, answer):
+        """Raise ValueError if a dialog or a wizard step can't return this."""
+        def is_int(value):
+            return isinstance(value, int) and not isinstance(value, bool)
+
+        def is_str_list(value):
+            return (isinstance(value, (list, tuple)) and
+                    all(isinstance(item, str) for item in value))
+
+        function = step['function']
+        if function in ['button_dialog', 'preview_dialog']:
+            valid = is_int(answer) and -1 <= answer < len(
+                step.get('choices', ['OK', 'Cancel']))
+        elif function == 'input_dialog':
+            initial_values = default_answer(step)
+            n_boxes = (len(initial_values) if isinstance(initial_values, list)
+                       else 1)
+            valid = (answer == -1 or
+                     (n_boxes == 1 and isinstance(answer, str)) or
+                     (n_boxes > 1 and is_str_list(answer) and
+                      len(answer) == n_boxes))
+        elif function == 'checklist_dialog':
+            valid = answer == -1 or (
+                isinstance(answer, (list, tuple)) and
+                all(is_int(index) and 0 <= index < len(step['choices'])
+                    for index in answer))
+        elif function in ['get_folder', 'get_filename']:
+            valid = isinstance(answer, str)
+        elif function == 'get_filenames':
+            valid = is_str_list(answer)
+        elif function == 'message':
+            valid = answer is None
+        else:  # wizard
+            valid = answer == -1 or (
+                isinstance(answer, (list, tuple)) and
+                len(answer) == len(step['steps']))
+            if valid and answer != -1:
+                for substep, subanswer in zip(step['steps'], answer):
+                    check_answer(substep, subanswer)
+        if not valid:
+            raise ValueError(f"The queued answer {answer!r} can't be "
+                             f"returned by {function}.")
+
+    try:
+        response = _headless_responses.popleft()
+    except IndexError:  # No queued answer
+        return ['', default]
+
+    try:
+        check_answer(kwargs, response)
+    except ValueError as e:
+        return ['ValueError', str(e)]
+
+    if function == 'checklist_dialog' and response != -1:
+        response = _to_ranges(response)  # As returned by cmd.py
+    return ['', response]
+
+
+def set_listing_cache(on_disk: bool = False,
+                      max_entries: int = 1000000,
+                      max_disk_size: int = 100 * 1024 * 1024) -> None:
+    """
+    Configure the cache of the folder listings shown by `get_filenames`.
+
+    Once read, the listing of each folder is kept in a cache, so that it is
+    shown instantly the next time this folder is opened. A cached listing is
+    used only if the folder was not modified since (i.e., if no file was
+    added, removed or renamed). The least recently used listings are
+    evicted when the cache is full.
+
+    The in-memory cache lives as long as the dialog process, which is the
+    whole session in the 'server' launch mode. The on-disk cache, in
+    Limited Interaction's temporary folder, is shared by all processes and
+    sessions.
+
+    Parameters
+    ----------
+    on_disk
+        Optional. True to also keep the listings on disk. Default is False.
+    max_entries
+        Optional. Maximal number of files and folders in the in-memory
+        cache. Default is 1000000.
+    max_disk_size
+        Optional. Maximal size of the on-disk cache in bytes. Default is
+        100 MB.
+
+    Returns
+    -------
+    None
+
+    """
+    _listing_cache['on_disk'] = on_disk
+    _listing_cache['max_entries'] = max_entries
+    _listing_cache['max_disk_size'] = max_disk_size
+
+
+def _listing_cache_arguments() -> dict:
+    """Return the listing cache argument of cmd.py's get_filenames."""
+    folder = None
+    if _listing_cache['on_disk'] and _get_temp_folder() != '.':
+        folder = os.path.join(_get_temp_folder(), 'listings')
+    return {'folder': folder,
+            'max_entries': _listing_cache['max_entries'],
+            'max_disk_size': _listing_cache['max_disk_size']}
+
+
+def _get_server() -> _DialogServer:
+    """Return the dialog server of the current launch mode."""
+    mode = _launch_mode[0]
+    server = _servers.get(mode)
+    if server is not None and server.pid != os.getpid():
+        # Inherited from the parent by fork: its pipes and its reader thread
+        # belong to the parent.
+        if _servers.get(mode) is server:
+            _servers.pop(mode, None)
+    if mode not in _servers:
+        if mode == 'remote':
+            server = _DialogConnection(_remote['address'], _remote['authkey'])
+        else:
+            server = _DialogServer(mode)
+        # setdefault is atomic: concurrent threads get the same server.
+        _servers.setdefault(mode, server)
+    return _servers[mode]
+
+
+def _matplotlib_event_loop():
+    """
+    Return a pump for Matplotlib's interactive figures.
+
+    Every open figure is serviced: the stale ones are redrawn, and the GUI
+    event loop, which is shared by all the figures of a backend, is run for
+    the requested time. Since redrawing is the costly part, the figures are
+    redrawn at most once per redraw tick, which adapts to the measured
+    drawing time so that drawing takes at most about a tenth of the waiting
+    time, with a tick between 20 ms (cheap figures stay fluid) and 1 s.
+
+    The event loop of the Qt and Tk backends is run by a pump of their
+    toolkit, which is stopped as soon as the dialog is answered.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.backend_bases import FigureCanvasBase
+
+    last_draw = [0.0]  # time.perf_counter() at the end of the last redraw
+    tick = [0.0]  # Minimal time between two redraws
+    toolkit_pumps = {}  # Backend module name -> pump of its GUI toolkit
+
+    def toolkit_pump(canvas):
+        """Return the pump of the canvas's GUI toolkit, if we have one."""
+        module = type(canvas).__module__
+        for name, factory in [('backend_qt', _qt_event_loop),
+                              ('backend_tk', _tk_event_loop)]:
+            if name in module:
+                if name not in toolkit_pumps:
+                    toolkit_pumps[name] = factory()
+                return toolkit_pumps[name]
+        return None
+
+    def pump(timeout):
+        managers = [
+            manager for manager in
+            plt._pylab_helpers.Gcf.get_all_fig_managers()
+            if type(manager.canvas).start_event_loop is not
+            FigureCanvasBase.start_event_loop]
+        if len(managers) == 0:
+            return False  # No figure or no GUI event loop to run.
+
+        now = time.perf_counter()
+        if now - last_draw[0] >= tick[0]:
+            stale = [manager.canvas for manager in managers
+                     if manager.canvas.figure.stale]
+            if len(stale) > 0:
+                for canvas in stale:
+                    canvas.draw()
+                last_draw[0] = time.perf_counter()
+                tick[0] = min(1.0, max(0.02, 10 * (last_draw[0] - now)))
+
+        active = plt._pylab_helpers.Gcf.get_active()
+        canvas = (active if active in managers else managers[0]).canvas
+        delegate = toolkit_pump(canvas)
+        if delegate is not None and delegate(timeout):
+            return True
+        if timeout > 0:
+            canvas.start_event_loop(timeout)
+        else:  # start_event_loop(0) would never return.
+            canvas.flush_events()
+        return True
+
+    def stop():
+        for delegate in list(toolkit_pumps.values()):
+            if delegate is not None:
+                delegate.stop()
+
+    pump.stop = stop
+    return pump
+
+
+def _qt_event_loop():
+    """Return a pump for the running Qt application, if any."""
+    for binding in ['PyQt6', 'PySide6', 'PyQt5', 'PySide2']:
+        if binding + '.QtCore' in sys.modules:
+            QtCore = sys.modules[binding + '.QtCore']
+            break
+    else:
+        return None
+
+    # Enum scoping differs between the bindings.
+    queued = getattr(QtCore.Qt, 'QueuedConnection', None)
+    if queued is None:
+        queued = QtCore.Qt.ConnectionType.QueuedConnection
+    lock = Lock()
+    running = []  # Local event loops being run (nested if reentered)
+    stopped = [False]  # Stopped while no local event loop was running
+
+    def pump(timeout):
+        app = QtCore.QCoreApplication.instance()
+        if app is None:
+            return False
+        loop = QtCore.QEventLoop()
+        with lock:
+            was_stopped, stopped[0] = stopped[0], False
+            if timeout > 0 and not was_stopped:
+                running.append(loop)
+        if timeout <= 0 or was_stopped:
+            app.processEvents()
+            return True
+        # Run a local event loop, which sleeps until the next event.
+        QtCore.QTimer.singleShot(int(timeout * 1000), loop.quit)
+        try:
+            if hasattr(loop, 'exec'):
+                loop.exec()
+            else:  # PyQt5 and PySide2 before Python 3
+                loop.exec_()
+        finally:
+            with lock:
+                running.remove(loop)
+        return True
+
+    def stop():
+        # Quitting a loop from another thread must go through its queue.
+        with lock:
+            for loop in running:
+                QtCore.QMetaObject.invokeMethod(loop, 'quit', queued)
+            if len(running) == 0:
+                stopped[0] = True
+
+    pump.stop = stop
+    return pump
+
+
+def _tk_event_loop():
+    """
+    Return a pump for the default Tk root of this process, if any.
+
+    Tk can't be called from another thread while it is not running its
+    main loop, so the pump is stopped through a pipe that Tk watches, or
+    where Tk can't watch files (Windows), through a flag that it checks
+    every 50 ms.
+    """
+    import tkinter as tk
+
+    stopped = [False]  # Set by stop, from any thread
+    waiting = []  # Variables of the running slices (nested if reentered)
+    wakeup = [None]  # (read, write) file descriptors of the pipe
+
+    def wake(*args):
+        """Drain the pipe and end the running slices."""
+        try:
+            while os.read(wakeup[0][0], 512):
+                pass
+        except OSError:  # Drained
+            pass
+        stopped[0] = False
+        for variable in waiting:
+            variable.set(True)
+
+    def check(root, variable):
+        """End this slice if it has been stopped, else check again later."""
+        if stopped[0]:
+            stopped[0] = False
+            variable.set(True)
+        else:
+            variable.check_id = root.after(50, check, root, variable)
+
+    def pump(timeout):
+        root = getattr(tk, '_default_root', None)
+        if root is None:
+            return False
+        watch = hasattr(root.tk, 'createfilehandler')
+        if watch and wakeup[0] is None:
+            wakeup[0] = os.pipe()
+            for fd in wakeup[0]:
+                os.set_blocking(fd, False)
+        if stopped[0] and not watch:
+            stopped[0] = False
+            timeout = 0
+        if timeout <= 0:
+            root.update()
+            return True
+
+        # Wait on a variable, which processes the events meanwhile.
+        elapsed = tk.BooleanVar(root)
+        elapsed.check_id = None
+        timer = root.after(int(timeout * 1000), elapsed.set, True)
+        if watch:
+            if len(waiting) == 0:
+                root.tk.createfilehandler(wakeup[0][0], tk.READABLE, wake)
+        else:
+            check(root, elapsed)
+        waiting.append(elapsed)
+        try:
+            root.wait_variable(elapsed)
+        finally:
+            waiting.remove(elapsed)
+            try:
+                root.after_cancel(timer)
+                if watch and len(waiting) == 0:
+                    root.tk.deletefilehandler(wakeup[0][0])
+                elif elapsed.check_id is not None:
+                    root.after_cancel(elapsed.check_id)
+            except tk.TclError:  # The root has been destroyed meanwhile
+                pass
+        return True
+
+    def stop():
+        stopped[0] = True
+        if wakeup[0] is not None:
+            try:
+                os.write(wakeup[0][1], b'.')
+            except OSError:  # The pipe is full: a stop is pending anyway.
+                pass
+
+    pump.stop = stop
+    return pump
+
+
+def _ipython_event_loop():
+    """Return a pump for IPython's GUI input hook (%gui), if any."""
+    try:
+        shell = sys.modules['IPython'].get_ipython()
+    except Exception:
+        return None
+    if shell is None or not hasattr(shell, '_inputhook'):
+        return None  # Not a terminal shell (e.g., a Jupyter kernel)
+
+    # Some input hooks (e.g., tk, qt and gtk on POSIX) only return once the
+    # context's file descriptor is readable, and never check input_is_ready:
+    # this pipe is written to at the deadline, and by stop.
+    wakeup = os.pipe()
+    for fd in wakeup:
+        os.set_blocking(fd, False)
+    stopped = [False]  # Set by stop, from any thread
+
+    def wake():
+        try:
+            os.write(wakeup[1], b'.')
+        except OSError:  # The pipe is full: a wakeup is pending anyway.
+            pass
+
+    class Context:
+        """Input hook context that stops the hook after a timeout."""
+
+        def __init__(self, timeout):
+            self.deadline = time.monotonic() + timeout
+
+        def input_is_ready(self):
+            return stopped[0] or time.monotonic() >= self.deadline
+
+        def fileno(self):  # Some input hooks watch this file descriptor.
+            return wakeup[0]
+
+    def pump(timeout):
+        if shell._inputhook is None:  # No %gui event loop
+            return False
+        timer = Timer(timeout, wake)
+        timer.daemon = True
+        timer.start()
+        try:
+            shell.inputhook(Context(timeout))
+        finally:
+            timer.cancel()
+            try:
+                while os.read(wakeup[0], 512):
+                    pass
+            except OSError:  # Drained
+                pass
+            stopped[0] = False
+        return True
+
+    def stop():
+        stopped[0] = True
+        wake()
+
+    pump.stop = stop
+    return pump
+
+
+_event_loops = [  # Registered event loops, see register_event_loop
+    {'name': 'matplotlib', 'factory': _matplotlib_event_loop,
+     'modules': ['matplotlib.pyplot']},
+    {'name': 'qt', 'factory': _qt_event_loop,
+     'modules': ['PyQt6.QtCore', 'PySide6.QtCore', 'PyQt5.QtCore',
+                 'PySide2.QtCore']},
+    {'name': 'tk', 'factory': _tk_event_loop, 'modules': ['tkinter']},
+    {'name': 'ipython', 'factory': _ipython_event_loop,
+     'modules': ['IPython']},
+]
+
+
+def register_event_loop(name: str, factory, modules: Sequence[str] = [],
+                        first: bool = True) -> None:
+    """
+    Register an event loop to keep running while waiting for a dialog.
+
+    While a blocking dialog is shown, the event loops of the host process
+    (e.g., Matplotlib figures, a Qt viewer) are run in short slices, so that
+    they don't freeze. Integrations for Matplotlib, Qt, Tk and IPython's
+    terminal input hooks are already registered.
+
+    Parameters
+    ----------
+    name
+        Name of the event loop. Registering a name that is already
+        registered replaces it.
+    factory
+        A function without argument that returns a pump function, or None
+        if this event loop cannot be used. The pump function is only called
+        from the main thread. The factory is called once when the
+        event loops are selected, i.e., the first time a dialog waits
+        after any of `modules` has been imported. The pump function takes
+        a timeout in seconds, runs the event loop for at most this time (or
+        only processes the pending events if the timeout is 0), and
+        returns True, or returns False immediately if there is nothing to
+        run at this moment (e.g., no open window). The pump function may
+        have a `stop` attribute: a function without argument, called from
+        any thread when the dialog is answered, that makes the running
+        slice return as soon as possible. Without it, the dialog's answer
+        waits for the end of the slice, i.e., 0.2 s at most.
+    modules
+        Optional. The event loop is only used if one of these modules is
+        imported. By default, it is always used.
+    first
+        Optional. True to try this event loop before the ones that are
+        already registered. Default is True.
+
+    Returns
+    -------
+    None
+
+    """
+    unregister_event_loop(name)
+    event_loop = {'name': name, 'factory': factory, 'modules': list(modules)}
+    if first:
+        _event_loops.insert(0, event_loop)
+    else:
+        _event_loops.append(event_loop)
+
+
+def unregister_event_loop(name: str) -> None:
+    """
+    Unregister an event loop registered using `register_event_loop`.
+
+    Parameters
+    ----------
+    name
+        Name of the event loop.
+
+    Returns
+    -------
+    None
+
+    """
+    _event_loops[:] = [event_loop for event_loop in _event_loops
+                       if event_loop['name'] != name]
+    _waiting_function[0] = None
+
+
+def _wait_done(future: 'Future', timeout: float = None) -> None:
+    """
+    Wait until a Future is done or cancelled, or until the timeout.
+
+    Unlike futures.wait, this also returns when the Future is cancelled
+    (e.g., after a dialog's timeout).
+    """
+    from concurrent import futures
+    try:
+        future.exception(timeout)
+    except (futures.CancelledError, futures.TimeoutError):
+        pass
+
+
+def _define_waiting_function():
+    """
+    Return the function that waits for a dialog to complete.
+
+    The returned function takes a Future and returns as soon as it is done.
+    Meanwhile, it runs the registered event loops whose modules are
+    imported, in slices of at most `_event_loop_slice` seconds: the first
+    one that has something to run waits for the slice, and the other ones
+    only process their pending events. The slice is stopped as soon as the
+    Future is done, using the `stop` attribute of the pumps. If no event
+    loop has anything to run, it simply waits on the Future, which takes no
+    CPU at all.
+
+    GUI toolkits can only be driven from the thread that owns them, which
+    is the main thread for the integrations registered by default. On any
+    other thread, the returned function simply waits on the Future.
+
+    The event loops are selected once, and again only when the registry or
+    the set of imported modules that it refers to change.
+    """
+    if current_thread() is not main_thread():
+        return _wait_done
+
+    key = tuple(event_loop['name'] for event_loop in _event_loops
+                if len(event_loop['modules']) == 0 or
+                any(module in sys.modules for module in event_loop['modules']))
+    if _waiting_function[0] is not None and _waiting_function[0][0] == key:
+        return _waiting_function[0][1]
+
+    pumps = []
+    for event_loop in _event_loops:
+        if event_loop['name'] in key:
+            try:
+                pump = event_loop['factory']()
+            except Exception:
+                pump = None  # This integration does not work here
+            if pump is not None:
+                pumps.append(pump)
+
+    stops = [pump.stop for pump in pumps if hasattr(pump, 'stop')]
+
+    def stop_pumps(future):
+        """End the running slice, from the thread that completed future."""
+        for stop in stops:
+            stop()
+
+    if len(pumps) == 0:
+        def wait(future):
+            """Wait for user."""
+            _wait_done(future)
+
+    else:
+        def wait(future):
+            """Wait for user while running the event loops."""
+            future.add_done_callback(stop_pumps)
+            while not future.done():
+                timeout = _event_loop_slice
+                for pump in pumps:
+                    if pump(timeout):
+                        timeout = 0  # The slice has been waited.
+                    if future.done():
+                        return
+                if timeout > 0:  # Nothing to run, wait a bit longer.
+                    _wait_done(future, 10 * timeout)
+
+    _waiting_function[0] = (key, wait)
+    return wait
+
+
+def _command_call(kwargs: dict, debug: bool = False) -> list:
+    """
+    Return the command that runs cmd.py with these arguments.
+
+    Arguments that are too long for the command line (e.g., thousands of
+    choices) are replaced by '-': they must then be written as the first
+    line of cmd.py's stdin (see `_stdin_arguments`).
+    """
+    arguments = json.dumps(kwargs)
+    if len(arguments) > _max_command_line_arguments:
+        arguments = '-'
+
+    command_call = [
+        sys.executable,  # python3
+        _cmd_path,  # cmd.py
+        arguments]
+
+    if debug:
+        print('-------')
+        print(f'command call: {command_call}')
+        expanded = ''
+        for _ in command_call:
+            expanded = expanded + f"'{_}' "
+        print('-------')
+        print(f'expanded command call: {expanded}')
+
+    return command_call
+
+
+def _stdin_arguments(command_call: list, kwargs: dict) -> bytes:
+    """Return what to write first on cmd.py's stdin for this command."""
+    if command_call[-1] == '-':
+        return (json.dumps(kwargs) + '\n').encode()
+    return b''
+
+
+def _unpack_output(to_return: list, convert=None):
+    """
+    Return the contents of cmd.py's output, or raise its error.
+
+    If convert is not None, the contents are passed through this function.
+    """
+    # Check if we should raise an error
+    if to_return[0] != '':
+        if to_return[0] == 'ModuleNotFoundError':
+            raise ModuleNotFoundError(to_return[1])
+        elif to_return[0] == 'ValueError':
+            raise ValueError(to_return[1])
+        elif to_return[0] == 'RuntimeError':
+            raise RuntimeError(to_return[1])
+        else:
+            raise Exception(to_return[0] + ': ' + to_return[1])
+
+    if convert is not None:
+        return convert(to_return[1])
+    return to_return[1]
+
+
+def _submit(kwargs: dict, debug: bool = False):
+    """
+    Launch a function and return the Future of its output.
+
+    Return a tuple (future, send). The Future's result is set to cmd.py's
+    output [returnval, contents] once the dialog is completed. Cancelling
+    the Future closes the dialog window. The send function sends an update
+    (e.g., {'message': 'new text'}) to the dialog.
+    """
+    import subprocess
+    from concurrent.futures import Future
+    if _launch_mode[0] == 'headless':
+        future = Future()
+        if kwargs['function'] not in ['message', 'progress']:
+            future.set_result(_headless_output(kwargs))
+        # Else, the window "stays open" until the future is cancelled.
+        return (future, lambda update: None)
+
+    if _trace_callbacks:  # Tracing is enabled
+        kwargs = dict(kwargs, timing=True)
+
+    broker = _get_broker_client()
+    if _launch_mode[0] == 'subprocess' and broker is None:
+        future = Future()
+        if _trace_callbacks:
+            future.traced = (kwargs['function'], time.time())
+        command_call = _command_call(kwargs, debug)
+        process = subprocess.Popen(command_call,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.DEVNULL)
+        process.stdin.write(_stdin_arguments(command_call, kwargs))
+        process.stdin.flush()
+        stdin_lock = Lock()
+
+        def threaded_function():
+            """Wait for the completion of cmd.py and set its output."""
+            stdout = process.stdout.read()
+            output_received = time.time()
+            process.wait()
+            with stdin_lock:
+                process.stdin.close()
+            try:
+                output = json.loads(stdout.decode())
+                _record_output_times(output, output_received,
+                                     getattr(future, 'traced', None))
+                _set_result(future, output)
+            except ValueError as e:
+                _set_result(future, [type(e).__name__, str(e)])
+
+        def send(update):
+            with stdin_lock:
+                try:
+                    process.stdin.write(
+                        (json.dumps(dict(update, update=True)) + '\n').encode())
+                    process.stdin.flush()
+                except (OSError, ValueError):  # Process already finished
+                    pass
+
+        def close(future):
+            if future.cancelled() and process.poll() is None:
+                process.kill()
+
+        # Wait for the process in a thread - probably too much but it works
+        # and it's easy.
+        thread = Thread(target=threaded_function)
+        thread.start()
+
+    else:
+        server = _get_server() if broker is None else broker
+        request_id, future = server.request(kwargs)
+
+        def send(update):
+            server.update(request_id, update)
+
+        def close(future):
+            if future.cancelled():
+                server.close(request_id)
+
+    future.add_done_callback(close)
+    return (future, send)
+
+
+def set_dialog_scheduler(max_dialogs: Union[int, None] = None,
+                         cascade: bool = True) -> None:
+    """
+    Configure how dialogs shown at the same time are scheduled.
+
+    Dialogs can be called from several threads at once. Each dialog waits
+    for a free slot before being shown, in order of `priority` (the
+    parameter accepted by every function except `message` and `progress`),
+    then in order of call. Only the dialogs called from the main thread
+    keep the host's GUI event loops running while they wait.
+
+    Parameters
+    ----------
+    max_dialogs
+        Optional. Maximal number of dialogs shown at the same time. Use 1 to
+        show the dialogs one after the other. Default is None (no limit).
+    cascade
+        Optional. If True, each dialog shown while other dialogs are open is
+        offset from them, so that the windows do not hide each other.
+        Default is True.
+
+    Returns
+    -------
+    None
+
+    """
+    with _scheduler['lock']:
+        _scheduler['max_dialogs'] = max_dialogs
+        _scheduler['cascade'] = cascade
+    _grant_slots()
+
+
+def _acquire_slot(priority: float = 0) -> 'Future':
+    """
+    Wait for a free dialog slot.
+
+    Return a Future of the slot number: 0 for the first open dialog, 1 for
+    the second one, etc. The slot must be released using `_release_slot`
+    once the dialog is closed. Cancelling the Future while it waits removes
+    it from the queue. When a slot is free and no other dialog waits, which
+    is always the case for a single-threaded script without max_dialogs,
+    the slot is granted immediately without touching the queue.
+    """
+    import heapq
+    from concurrent.futures import Future
+    future = Future()
+    with _scheduler['lock']:
+        if not _scheduler['queue'] and (
+                _scheduler['max_dialogs'] is None or
+                len(_scheduler['slots']) < _scheduler['max_dialogs']):
+            future.set_running_or_notify_cancel()
+            future.set_result(_take_slot())  # No callback yet, can't block
+            return future
+        heapq.heappush(_scheduler['queue'],
+                       (-priority, next(_scheduler['order']), future))
+    return future
+
+
+def _take_slot() -> int:
+    """Take the lowest free slot. Must be called with the lock."""
+    slot = 0
+    while slot in _scheduler['slots']:
+        slot += 1
+    _scheduler['slots'].add(slot)
+    return slot
+
+
+def _grant_slots() -> None:
+    """Grant the free slots to the waiting dialogs, by priority."""
+    import heapq
+    granted = []
+    with _scheduler['lock']:
+        while _scheduler['queue'] and (
+                _scheduler['max_dialogs'] is None or
+                len(_scheduler['slots']) < _scheduler['max_dialogs']):
+            future = heapq.heappop(_scheduler['queue'])[2]
+            if future.set_running_or_notify_cancel():  # Still waiting
+                granted.append((future, _take_slot()))
+    # Set the results outside the lock, since they run the callbacks.
+    for future, slot in granted:
+        future.set_result(slot)
+
+
+def _release_slot(slot: int) -> None:
+    """Release the slot of a closed dialog."""
+    with _scheduler['lock']:
+        _scheduler['slots'].discard(slot)
+    _grant_slots()
+
+
+def _slot_arguments(kwargs: dict, slot: int) -> dict:
+    """Return the arguments of a dialog shown in this slot."""
+    if slot > 0 and _scheduler['cascade']:
+        return dict(kwargs, cascade=slot)
+    return kwargs
+
+
+def _schedule(kwargs: dict, priority: float = 0, debug: bool = False):
+    """
+    Launch a function once the scheduler grants it a slot.
+
+    Return the Future of cmd.py's output, as `_submit`. Cancelling it
+    before the dialog is shown removes the dialog from the queue.
+    """
+    from concurrent.futures import Future
+    if _get_broker_client() is not None:  # Scheduled by the broker
+        return _submit(dict(kwargs, priority=priority), debug)[0]
+    if _launch_mode[0] == 'headless':
+        return _submit(kwargs, debug)[0]
+
+    def submit(slot):
+        future = _submit(_slot_arguments(kwargs, slot), debug)[0]
+        future.add_done_callback(lambda future: _release_slot(slot))
+        return future
+
+    slot_future = _acquire_slot(priority)
+    if slot_future.done():
+        return submit(slot_future.result())
+
+    output = Future()
+    output.add_done_callback(
+        lambda output: slot_future.cancel() if output.cancelled() else None)
+
+    def start(slot_future):
+        if slot_future.cancelled():
+            return
+        if output.cancelled():  # Cancelled while being granted the slot
+            _release_slot(slot_future.result())
+            return
+        future = submit(slot_future.result())
+        future.add_done_callback(
+            lambda future: None if future.cancelled() else
+            _set_result(output, future.result()))
+        output.add_done_callback(
+            lambda output: future.cancel() if output.cancelled() else None)
+
+    slot_future.add_done_callback(start)
+    return output
+
+
+def _unpacked_future(future: 'Future', convert=None, expired: Event = None,
+                     default=None) -> 'Future':
+    """
+    Return a Future of the contents of cmd.py's output Future.
+
+    The returned Future raises the error returned by cmd.py if any.
+    Cancelling it cancels the output Future, which closes the window. If
+    convert is not None, the contents are passed through this function. If
+    the output Future is cancelled after the expired Event is set, the
+    result is default.
+    """
+    from concurrent.futures import Future
+    unpacked = Future()
+
+    def unpack(future):
+        if future.cancelled():
+            if expired is not None and expired.is_set():
+                _set_result(unpacked, default)
+            else:
+                unpacked.cancel()
+            return
+        try:
+            _set_result(unpacked, _unpack_output(future.result(), convert))
+        except Exception as e:
+            try:
+                unpacked.set_exception(e)
+            except Exception:  # The unpacked future has been cancelled.
+                pass
+
+    def cancel(unpacked):
+        if unpacked.cancelled():
+            future.cancel()
+
+    unpacked.add_done_callback(cancel)
+    future.add_done_callback(unpack)
+    return unpacked
+
+
+def set_answer_store(max_entries: int = 1000,
+                     max_age: float = 30 * 24 * 3600) -> None:
+    """
+    Configure the store of the answers remembered using `remember`.
+
+    Dialogs called with a `remember` key show a "Remember my answer" check
+    box. If the user checks it, the answer is stored in Limited
+    Interaction's temporary folder, and the next calls with the same key,
+    message and choices (or labels) return this answer immediately, without
+    showing any window, in this session and the next ones.
+
+    Parameters
+    ----------
+    max_entries
+        Optional. Maximal number of remembered answers. The least recently
+        used answers are forgotten first. Default is 1000.
+    max_age
+        Optional. Time in seconds after which an answer is forgotten.
+        Default is 30 days.
+
+    Returns
+    -------
+    None
+
+    """
+    _answer_store['max_entries'] = max_entries
+    _answer_store['max_age'] = max_age
+
+
+def forget_answers() -> None:
+    """
+    Forget every answer remembered using the `remember` parameter.
+
+    Returns
+    -------
+    None
+
+    """
+    with _answer_store['lock']:
+        _answer_store['answers'] = {}
+        try:
+            os.remove(_answers_file())
+        except OSError:
+            pass
+
+
+def _answers_file() -> str:
+    """Return the file of the answer store."""
+    return os.path.join(_get_temp_folder(), 'answers.json')
+
+
+def _read_answers() -> dict:
+    """Read the answer store file, or return {} if it can't be read."""
+    try:
+        with open(_answers_file(), 'r') as fid:
+            return json.load(fid)
+    except (OSError, ValueError):
+        return {}
+
+
+def _answer_key(kwargs: dict, remember: str) -> str:
+    """Return the key of a call in the answer store."""
+    prompt = {key: kwargs[key] for key in
+              ['function', 'message', 'choices', 'labels', 'steps',
+               'patterns'] if key in kwargs}
+    return json.dumps([remember, prompt], sort_keys=True)
+
+
+def _recall_answer(key: str):
+    """
+    Return a remembered answer.
+
+    Return a tuple (found, answer), where answer is the contents of cmd.py's
+    output. The answer store is read only once per session, so that this
+    lookup takes microseconds.
+    """
+    with _answer_store['lock']:
+        if _answer_store['answers'] is None:
+            _answer_store['answers'] = _read_answers()
+        entry = _answer_store['answers'].get(key)
+        if (entry is None or
+                time.time() - entry['time'] > _answer_store['max_age']):
+            return (False, None)
+        entry['used'] = time.time()  # Saved on the next stored answer
+        return (True, entry['answer'])
+
+
+def _remember_answer(key: str, answer) -> None:
+    """
+    Store an answer in the answer store.
+
+    The store file is read again before being written, so that the answers
+    stored meanwhile by other processes are kept. The answers older than
+    max_age, then the least recently used ones, are evicted.
+    """
+    with _answer_store['lock']:
+        answers = _read_answers()
+        for other_key, entry in (_answer_store['answers'] or {}).items():
+            if (other_key in answers
+                    and entry['used'] > answers[other_key]['used']):
+                answers[other_key]['used'] = entry['used']
+
+        now = time.time()
+        answers[key] = {'answer': answer, 'time': now, 'used': now}
+        answers = {
+            other_key: entry for other_key, entry in answers.items()
+            if now - entry['time'] <= _answer_store['max_age']}
+        if len(answers) > _answer_store['max_entries']:
+            kept = sorted(answers, key=lambda other_key:
+                          answers[other_key]['used'])
+            kept = kept[-_answer_store['max_entries']:]
+            answers = {other_key: answers[other_key] for other_key in kept}
+
+        _answer_store['answers'] = answers
+        try:
+            with open(_answers_file() + '.tmp', 'w') as fid:
+                json.dump(answers, fid)
+            os.replace(_answers_file() + '.tmp', _answers_file())
+        except OSError:
+            pass  # The answer will only be remembered for this session
+
+
+def _pop_remember(kwargs: dict):
+    """
+    Pop the remember argument of a function and look for its answer.
+
+    Return a tuple (key, found, answer). key is None if the call does not
+    use the answer store. Otherwise, if no answer is found, cmd.py is asked
+    to show the "Remember my answer" check box. The answer store is not
+    used in the 'headless' launch mode.
+    """
+    remember = kwargs.pop('remember', None)
+    if remember is None or _launch_mode[0] == 'headless':
+        return (None, False, None)  # Headless answers stay reproducible
+    if any(kwargs.get('masked', [])):
+        raise ValueError('The answer of masked inputs cannot be remembered.')
+    if kwargs.get('function') in ['get_folder', 'get_filename']:
+        # These native file dialogs have no room for the check box.
+        raise ValueError(
+            f"The answer of {kwargs['function']} cannot be remembered.")
+
+    key = _answer_key(kwargs, remember)
+    found, answer = _recall_answer(key)
+    if not found:
+        kwargs['remember'] = True
+    return (key, found, answer)
+
+
+def _store_remembered(key: str, function: str, output) -> None:
+    """Store the answer of a dialog if the user asked to remember it."""
+    if (isinstance(output, list) and len(output) > 2 and output[0] == ''
+            and output[2].get('remember', False)
+            and output[1] != _closed_values.get(function)):
+        _remember_answer(key, output[1])
+
+
+def _pop_timeout(kwargs: dict):
+    """
+    Pop the timeout, default and countdown arguments of a function.
+
+    Return a tuple (timeout, default), where default is the value returned
+    by the function when its window is closed if no default was given. If
+    countdown is True, the timeout is passed to cmd.py as 'countdown', so
+    that the dialog shows the remaining time. In the 'headless' launch mode,
+    an explicit default is kept in kwargs, to be used as the default answer.
+    """
+    import copy
+    timeout = kwargs.pop('timeout', None)
+    if 'default' in kwargs and _launch_mode[0] == 'headless':
+        default = kwargs['default']
+    elif 'default' in kwargs:
+        default = kwargs.pop('default')
+    else:  # A copy, so that the caller can't modify the shared value
+        default = copy.copy(_closed_values.get(kwargs['function']))
+    if kwargs.pop('countdown', False) and timeout is not None:
+        kwargs['countdown'] = timeout
+    return (timeout, default)
+
+
+def _launch_subprocess(blocking=True, debug=False, convert=None, **kwargs):
+    """
+    Launch a function and update event loop while waiting (if blocking).
 
-# Set some constants
-is_pc = True if platform.system() == 'Windows' else False
-is_mac = True if platform.system() == 'Darwin' else False
-is_linux = True if platform.system() == 'Linux' else False
-my_path = os.path.dirname(os.path.abspath(__file__))
+    If not blocking, return a Future of the function's result instead. If
+    convert is not None, the function's result is passed through this
+    function (e.g., to convert a json list to another type). If the user
+    did not answer after the timeout, the window is closed and the default
+    value is returned (see _pop_timeout).
+    """
+    from concurrent.futures import Future
+    timeout, default = _pop_timeout(kwargs)
+    priority = kwargs.pop('priority', 0)
+    key, found, answer = _pop_remember(kwargs)
+    if found:
+        if not blocking:
+            future = Future()
+            future.set_result(_unpack_output(['', answer], convert))
+            return future
+        return _unpack_output(['', answer], convert)
+
+    future = _schedule(kwargs, priority, debug)
+    if key is not None:
+        function = kwargs['function']
+        future.add_done_callback(
+            lambda future: None if future.cancelled() else
+            _store_remembered(key, function, future.result()))
+
+    expired = Event()
+    if timeout is not None and not future.done():
+        def expire():
+            expired.set()
+            future.cancel()  # Closes the window
+
+        timer = Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        future.add_done_callback(lambda future: timer.cancel())
+
+    if not blocking:
+        return _unpacked_future(future, convert, expired, default)
+
+    _define_waiting_function()(future)  # Update event loop or just wait.
+    if future.cancelled():  # Only possible after the timeout
+        return default
+    return _unpack_output(future.result(), convert)
+
+
+async def _launch_subprocess_async(blocking=True, debug=False, convert=None,
+                                   **kwargs):
+    """
+    Launch a function without blocking the running asyncio event loop.
 
-# Temporary folder
-def _try_folder(folder: str) -> bool:
-    """Try this folder for write access as a temporary folder."""
+    In the 'subprocess' launch mode, cmd.py is run using
+    asyncio.create_subprocess_exec. In the other launch modes, the request's
+    Future is awaited directly. No thread is created in any case. If the
+    coroutine is cancelled, the dialog window is closed.
+    """
+    import asyncio
+
+    if not blocking or _launch_mode[0] == 'headless':
+        # Nothing to wait for, this never blocks.
+        return _launch_subprocess(blocking=blocking, debug=debug,
+                                  convert=convert, **kwargs)
+
+    if _get_broker_client() is not None:
+        return await asyncio.wrap_future(_launch_subprocess(
+            blocking=False, debug=debug, convert=convert, **kwargs))
+
+    timeout, default = _pop_timeout(kwargs)
+    priority = kwargs.pop('priority', 0)
+    key, found, answer = _pop_remember(kwargs)
+    if found:
+        return _unpack_output(['', answer], convert)
+
+    # Wait for the scheduler, which also counts in the timeout.
+    slot_future = _acquire_slot(priority)
+    if not slot_future.done():
+        deadline = None if timeout is None else time.monotonic() + timeout
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(slot_future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if not slot_future.cancel():  # The slot was being granted
+                slot_future.add_done_callback(
+                    lambda slot_future: _release_slot(slot_future.result()))
+            if isinstance(e, asyncio.TimeoutError):
+                return default
+            raise
+        if deadline is not None:
+            timeout = max(0, deadline - time.monotonic())
+
+    slot = slot_future.result()
     try:
-        os.mkdir(folder)
-    except FileExistsError:
-        pass
-    except Exception:
-        return False
+        output = await _communicate_async(_slot_arguments(kwargs, slot),
+                                          timeout, debug)
+    finally:
+        _release_slot(slot)
+    if output is None:  # Timeout
+        return default
 
-    return True
+    if key is not None:
+        _store_remembered(key, kwargs['function'], output)
+    return _unpack_output(output, convert)
 
 
-try_list = []
+async def _communicate_async(kwargs: dict, timeout: Union[float, None],
+                             debug: bool = False):
+    """
+    Show a dialog without blocking the running asyncio event loop.
+
+    Return cmd.py's output, or None if the user did not answer after the
+    timeout.
+    """
+    import subprocess
+    import asyncio
+
+    traced = None
+    if _trace_callbacks:  # Tracing is enabled
+        kwargs = dict(kwargs, timing=True)
+        traced = (kwargs['function'], time.time())
+
+    if _launch_mode[0] == 'subprocess':
+        # stdin is kept open until the end, since cmd.py closes the dialog
+        # when its stdin is closed.
+        command_call = _command_call(kwargs, debug)
+        process = await asyncio.create_subprocess_exec(
+            *command_call,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL)
+        process.stdin.write(_stdin_arguments(command_call, kwargs))
+
+        async def communicate():
+            try:
+                stdout = await process.stdout.read()
+                await process.wait()
+            except asyncio.CancelledError:  # Also on timeout
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+                raise
+            finally:
+                process.stdin.close()
+            return stdout
 
-if is_pc and "TEMP" in os.environ:
-    try_list.append(os.environ["TEMP"] + "/limitedinteraction")
-if is_mac and "TMPDIR" in os.environ:
-    try_list.append(os.environ["TMPDIR"] + "/limitedinteraction")
-if "HOME" in os.environ:
-    try_list.append(os.environ["HOME"] + "/.limitedinteraction")
-# Last try
-try_list.append(".")
+        try:
+            stdout = await asyncio.wait_for(communicate(), timeout)
+        except asyncio.TimeoutError:
+            return None
 
-for _temp_folder in try_list:
-    if _try_folder(_temp_folder):
-        break
+        output_received = time.time()
+        try:
+            output = json.loads(stdout.decode())
+            _record_output_times(output, output_received, traced)
+        except ValueError as e:
+            output = [type(e).__name__, str(e)]
 
-if _temp_folder == ".":
-    warnings.warn("Could not set temporary folder.")
+    else:
+        server = _get_server()
+        request_id, future = server.request(kwargs)
+        try:
+            output = await asyncio.wait_for(asyncio.wrap_future(future),
+                                            timeout)
+        except asyncio.TimeoutError:
+            server.close(request_id)
+            return None
+        except asyncio.CancelledError:
+            server.close(request_id)
+            raise
 
-# Set some state variables
-_message_window_int = [0]
+    return output
 
 
-def _define_polling_pause():
+class MessageWindow:
     """
-    Return the polling pause function.
+    Handle to a message window, as returned by `message`.
 
-    The returned function is a wrapper to either matplotlib.pyplot.pause (in
-    the case where matplotlib is among the imported modules), or time.sleep
-    (if matplotlib is not imported).
+    The window stays open until `close` is called or until a new message is
+    shown using `message`.
     """
-    if 'matplotlib' in sys.modules:
-        import matplotlib.pyplot as plt
-        def polling_pause():
-            """Pause while refreshing Matplotlib while waiting for user."""
-            # This rewrite of Matplotlib pause was found here:
-            # https://stackoverflow.com/questions/45729092/make-interactive-matplotlib-window-not-pop-to-front-on-each-update-windows-7/45734500#45734500
-            manager = plt._pylab_helpers.Gcf.get_active()
-            if manager is not None:
-                canvas = manager.canvas
-                if canvas.figure.stale:
-                    canvas.draw_idle()
-                canvas.start_event_loop(0.2)
-            else:
-                time.sleep(0.2)
 
-    else:
-        def polling_pause():
-            """Pause while waiting for user."""
-            time.sleep(0.2)
+    #: Maximal number of updates per second sent to the window. Faster
+    #: updates are coalesced so that only the most recent one is shown.
+    max_update_rate = 60
+
+    def __init__(self, future: 'Future', send):
+        self._future = future
+        self._send = send
+        self._lock = Lock()
+        self._pending = None  # Most recent update, not sent yet
+        self._wakeup = Event()
+        self._sender = None
+        # Wake the sender up when the window is closed by any means (user,
+        # server exit), so that its thread ends.
+        future.add_done_callback(lambda future: self._wakeup.set())
+
+    @property
+    def closed(self) -> bool:
+        """True if the window has been closed."""
+        return self._future.done()
+
+    def update(self, message: str = None, icon=None) -> None:
+        """
+        Change the message and/or the icon of the window.
+
+        This function returns immediately. The window is updated in
+        background at most `max_update_rate` times per second, so that it
+        can be called at any frequency.
+
+        Parameters
+        ----------
+        message
+            Optional. The new message.
+        icon
+            Optional. The new icon (consult the module's help).
+
+        Returns
+        -------
+        None
+
+        """
+        with self._lock:
+            update = self._pending if self._pending is not None else {}
+            if message is not None:
+                update['message'] = message
+            if icon is not None:
+                update['icon'] = icon
+            self._pending = update
+
+            if self._sender is None:
+                self._sender = Thread(target=self._send_updates, daemon=True)
+                self._sender.start()
+
+        self._wakeup.set()
+
+    def _send_updates(self):
+        """Send the pending updates until the window is closed."""
+        while not self._future.done():
+            self._wakeup.wait()
+            self._wakeup.clear()
+            with self._lock:
+                update, self._pending = self._pending, None
+            if update is not None:
+                self._send(update)
+                time.sleep(1 / self.max_update_rate)
+
+    def close(self) -> None:
+        """Close the window."""
+        self._future.cancel()
+        self._wakeup.set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class ProgressWindow(MessageWindow):
+    """
+    Handle to a progress window, as returned by `progress`.
 
-    return polling_pause
+    Call `advance` at each processed item, or set `value` directly. The
+    window stays open until `close` is called.
+    """
 
+    #: Maximal number of updates per second sent to the window.
+    max_update_rate = 10
+
+    def __init__(self, future: 'Future', send):
+        super().__init__(future, send)
+        #: Current progress, in items.
+        self.value = 0
+        self._start_time = time.perf_counter()
+        self._sender = Thread(target=self._send_updates, daemon=True)
+        self._sender.start()
+
+    def advance(self, n: float = 1) -> None:
+        """
+        Advance the progress by n items.
+
+        This only increments `value`: the window is updated in background
+        at most `max_update_rate` times per second, so that calling this
+        function in a tight loop costs almost nothing. It can be called from
+        several threads at once.
+        """
+        with self._lock:
+            self.value += n
+
+    def _send_updates(self):
+        """Send the progress and pending updates until the window is closed."""
+        sent_value = None
+        while not self._future.done():
+            self._wakeup.wait(1 / self.max_update_rate)
+            self._wakeup.clear()
+            with self._lock:
+                update, self._pending = self._pending, None
+            value = self.value
+            if value != sent_value:
+                if update is None:
+                    update = {}
+                update['value'] = value
+                update['elapsed'] = time.perf_counter() - self._start_time
+                sent_value = value
+            if update is not None:
+                self._send(update)
+
+
+def _show_message(message: str, debug: bool = False, **kwargs):
+    """Close the current message windows and show a new one (see message)."""
+    def forget(future):
+        try:
+            _message_windows.remove(window)
+        except ValueError:  # Already replaced by another message
+            pass
 
-def _launch_subprocess(blocking=True, debug=False, **kwargs):
-    """Launch a function and update event loop while waiting (if blocking)."""
-    output = [None]
-    command_call = [
-        sys.executable,  # python3
-        cmd.__file__,  # cmd.py
-        json.dumps(kwargs)]
+    # The lock ensures that only the last message of concurrent threads
+    # stays open.
+    with _message_lock:
+        # Begins by closing the current messages
+        while len(_message_windows) > 0:
+            _message_windows.pop().close()
 
-    if debug:
-        print('-------')
-        print(f'command call: {command_call}')
-        expanded = ''
-        for _ in command_call:
-            expanded = expanded + f"'{_}' "
-        print('-------')
-        print(f'expanded command call: {expanded}')
+        if message is None or message == '':
+            return None
 
-    def threaded_function():
-        """Start cmd.py in its own process and wait for its completion."""
-        if blocking:
-            output[0] = subprocess.check_output(command_call,
-                                                stderr=subprocess.DEVNULL)
-        else:
-            subprocess.call(command_call,
-                            stderr=subprocess.DEVNULL)
+        future, send = _submit(dict(
+            function='message',
+            message=message,
+            **kwargs), debug)
 
-    # Start the new process in a thread - probably too much but it works and
-    # it's easy.
-    thread = Thread(target=threaded_function)
-    thread.start()
+        window = MessageWindow(future, send)
+        _message_windows.append(window)
+    future.add_done_callback(forget)
+    return window
 
-    if blocking:
-        polling_pause = _define_polling_pause()
-        while output[0] is None:
-            polling_pause()  # Update event loop or just wait.
 
-    if output[0] is None:
-        return None
-    else:
-        to_return = json.loads(output[0].decode())
-
-        # Check if we should raise an error
-        if to_return[0] != '':
-            if to_return[0] == 'ModuleNotFoundError':
-                raise ModuleNotFoundError(to_return[1])
-            elif to_return[0] == 'ValueError':
-                raise ValueError(to_return[1])
-            else:
-                raise Exception(to_return[0] + ': ' + to_return[1])
+def progress(
+        message: str = '',
+        total: float = None,
+        unit: str = '',
+        **kwargs) -> ProgressWindow:
+    """
+    Show a non-blocking progress window.
+
+    The window shows a progress bar with the throughput and, if total is
+    known, the estimated remaining time.
+
+    Parameters
+    ----------
+    message
+        Optional. The message to show over the progress bar.
+    total
+        Optional. The total number of items to process. If None, the progress
+        bar is indeterminate.
+    unit
+        Optional. The name of the items, e.g., 'files', shown in the
+        throughput readout.
+    kwargs
+        Consult the module's help for additional parameters.
+
+    Returns
+    -------
+    ProgressWindow
+        A handle to the progress window, to advance the progress, update
+        the message or close the window. It can be used as a context manager
+        that closes the window at exit::
+
+            with li.progress('Processing files', total=len(files)) as p:
+                for file in files:
+                    process(file)
+                    p.advance()
 
-        return to_return[1]
+    """
+    future, send = _submit(dict(
+        function='progress',
+        message=message,
+        total=total,
+        unit=unit,
+        **kwargs))
+    return ProgressWindow(future, send)
 
 
 def message(
         message: str,
-        **kwargs) -> None:
+        **kwargs) -> Union[MessageWindow, None]:
     """
     Show or close a non-blocking message window.
 
@@ -214,32 +2597,12 @@ def message(
 
     Returns
     -------
-    None
+    MessageWindow or None
+        A handle to the new message window, which can be used to update its
+        message or to close it. None if message is ''.
 
     """
-    # Begins by deleting the current message
-    for file in os.listdir(_temp_folder):
-        if 'limitedinteraction_message_flag' in file:
-            os.remove(_temp_folder + '/' + file)
-
-    if message is None or message == '':
-        return
-
-    _message_window_int[0] += 1
-    flagfile = (f"{_temp_folder}/"
-                f"limitedinteraction_message_flag{_message_window_int}")
-
-    fid = open(flagfile, 'w')
-    fid.write("DELETE THIS FILE TO CLOSE THE LIMITEDINTERACTION MESSAGE "
-              "WINDOW.")
-    fid.close()
-
-    _launch_subprocess(
-        blocking=False,
-        function='message',
-        message=message,
-        flagfile=flagfile,
-        **kwargs)
+    return _show_message(message, **kwargs)
 
 
 def button_dialog(
@@ -255,6 +2618,9 @@ def button_dialog(
         Optional. Instruction to show to the user.
     choices
         Optional. List of str, each entry corresponding to a button caption.
+        If there are more than 15 choices, they are shown in a scrollable
+        list instead, which can be filtered by typing and navigated using
+        the keyboard. This list is fast even for thousands of choices.
     kwargs
         Consult the module's help for additional parameters.
 
@@ -272,6 +2638,151 @@ def button_dialog(
         **kwargs)
 
 
+def _preview_arguments(image, max_size: Sequence[int]):
+    """
+    Return the arguments that pass a preview image to cmd.py.
+
+    Return a tuple (arguments, block). The image is downscaled by keeping
+    one pixel every n pixels so that it fits in max_size, then written as
+    PPM data in a new shared memory block, which cmd.py reads directly
+    without any serialization. block must be released using
+    `_release_preview` once the dialog is closed. When shared memory can't
+    be used (e.g., in the 'remote' launch mode, where the dialog is shown on
+    another computer), the data is passed in base64 instead and block is
+    None.
+
+    Raises
+    ------
+    ValueError
+        If max_size is not positive, or if the image has an unsupported
+        shape or dtype.
+
+    """
+    if len(max_size) != 2 or not all(size > 0 for size in max_size):
+        raise ValueError('max_size must be a positive (width, height), got '
+                         f'{max_size!r}.')
+    if _launch_mode[0] == 'headless':
+        return ({}, None)  # Nothing to show
+
+    import numpy as np
+
+    if hasattr(image, 'canvas'):  # Matplotlib figure
+        canvas = image.canvas
+        if not hasattr(canvas, 'buffer_rgba'):  # Figure made without pyplot
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            canvas = FigureCanvasAgg(image)
+        canvas.draw()
+        image = np.asarray(canvas.buffer_rgba())
+    image = np.asarray(image)
+    if image.ndim == 2:
+        image = image[:, :, np.newaxis]
+    if image.ndim != 3 or image.shape[2] not in [1, 3, 4]:
+        raise ValueError('The image must be an array of shape (height, '
+                         'width), (height, width, 3) or (height, width, 4).')
+    if not (image.dtype == np.uint8 or image.dtype == np.bool_
+            or np.issubdtype(image.dtype, np.floating)):
+        # Other integers would be wrapped when written as uint8.
+        raise ValueError('The image must be of dtype uint8 (0 to 255), bool '
+                         f'or float (0 to 1), got {image.dtype}.')
+
+    # Downscale first, so that only the shown pixels are converted.
+    step = max(1, -(-image.shape[0] // max_size[1]),
+               -(-image.shape[1] // max_size[0]))
+    image = image[::step, ::step, :3]
+    if np.issubdtype(image.dtype, np.floating):
+        image = np.clip(image, 0, 1) * 255
+    elif image.dtype == np.bool_:
+        image = image.astype(np.uint8) * 255
+    height, width = image.shape[0:2]
+    header = f'P6 {width} {height} 255\n'.encode()
+    size = len(header) + height * width * 3
+
+    block = None
+    if _launch_mode[0] != 'remote':
+        try:
+            from multiprocessing import shared_memory
+            block = shared_memory.SharedMemory(create=True, size=size)
+        except (ImportError, OSError):
+            pass
+
+    if block is not None:
+        buffer = block.buf
+    else:
+        buffer = bytearray(size)
+    buffer[0:len(header)] = header
+    pixels = np.ndarray((height, width, 3), np.uint8, buffer,
+                        offset=len(header))
+    pixels[:] = image  # Broadcasts gray images to rgb
+    del pixels  # The block can't be closed while this view exists
+
+    if block is not None:
+        return ({'shared_memory': block.name, 'image_size': size}, block)
+    import base64
+    return ({'image_data': base64.b64encode(buffer).decode()}, None)
+
+
+def _release_preview(block) -> None:
+    """Release the shared memory block of a preview, if any."""
+    if block is not None:
+        block.close()
+        block.unlink()
+
+
+def preview_dialog(
+        image,
+        message: str = 'Please select an option',
+        choices: Sequence[str] = ['OK', 'Cancel'],
+        max_size: Sequence[int] = (800, 600),
+        **kwargs) -> int:
+    """
+    Show a blocking dialog window with an image and a selection of buttons.
+
+    The image's pixels are passed to the dialog process through shared
+    memory, so that even large frames are shown quickly. Requires NumPy.
+
+    Parameters
+    ----------
+    image
+        A NumPy array of shape (height, width) for grayscale, (height,
+        width, 3) for RGB or (height, width, 4) for RGBA images, either of
+        uint8 from 0 to 255, of bool (black and white) or of floats from 0
+        to 1, or a Matplotlib figure. Other dtypes raise a ValueError.
+    message
+        Optional. Instruction to show to the user.
+    choices
+        Optional. List of str, each entry corresponding to a button caption.
+    max_size
+        Optional. Maximal (width, height) of the image in pixels. Larger
+        images are downscaled. Default is (800, 600).
+    kwargs
+        Consult the module's help for additional parameters.
+
+    Returns
+    -------
+    int
+        The selected button index (0 = First button, 1 = Second button, etc.).
+        If the user closes the window instead of clicking a button, a value
+        of -1 is returned.
+    """
+    from concurrent.futures import Future
+    arguments, block = _preview_arguments(image, max_size)
+    try:
+        result = _launch_subprocess(
+            function='preview_dialog',
+            message=message,
+            choices=choices,
+            **arguments,
+            **kwargs)
+    except Exception:
+        _release_preview(block)
+        raise
+    if isinstance(result, Future):  # Not blocking
+        result.add_done_callback(lambda future: _release_preview(block))
+    else:
+        _release_preview(block)
+    return result
+
+
 def input_dialog(
         message: str = '',
         labels: Sequence[str] = [],
@@ -311,6 +2822,84 @@ def input_dialog(
         **kwargs)
 
 
+def _to_ranges(indices: Sequence[int]) -> list:
+    """Return indices as a sorted list of [start, stop] ranges."""
+    from .cmd import to_ranges  # The same implementation as cmd.py
+    return to_ranges(indices)
+
+
+def _selection_ranges(choices: Sequence[str],
+                      initial_selection: Sequence[int]) -> list:
+    """
+    Return a checklist's initial selection as [start, stop] ranges.
+
+    Raises
+    ------
+    ValueError
+        If initial_selection contains something else than indexes of
+        choices.
+
+    """
+    for index in initial_selection:
+        if (not isinstance(index, int) or isinstance(index, bool)
+                or not 0 <= index < len(choices)):
+            raise ValueError(
+                "initial_selection must only contain indexes of choices, "
+                f"got {index!r}.")
+    return _to_ranges(initial_selection)
+
+
+def _from_ranges(ranges):
+    """Return a list of [start, stop] ranges as an array of indices."""
+    if ranges == -1:  # Closed window
+        return -1
+    indices = array.array('i')
+    for start, stop in ranges:
+        indices.extend(range(start, stop))
+    return indices
+
+
+def checklist_dialog(
+        message: str = 'Please select the items',
+        choices: Sequence[str] = [],
+        initial_selection: Sequence[int] = [],
+        **kwargs) -> Union[array.array, int]:
+    """
+    Show a blocking dialog window with a list of items to select.
+
+    The list can be filtered by typing. Shift-click selects a range of
+    items, control-click (command-click on macOS) adds or removes an item,
+    and the Select all and Select none buttons apply to the listed items.
+    The selection is kept while the filter changes.
+
+    Parameters
+    ----------
+    message
+        Optional. Instruction to show to the user.
+    choices
+        Optional. List of str, each entry corresponding to an item.
+    initial_selection
+        Optional. Indexes of the items that are initially selected.
+    kwargs
+        Consult the module's help for additional parameters.
+
+    Returns
+    -------
+    array.array or int
+        The sorted indexes of the selected items, as an array('i'). If the
+        user closes the window instead of clicking OK, a value of -1 is
+        returned.
+
+    """
+    return _launch_subprocess(
+        function='checklist_dialog',
+        convert=_from_ranges,
+        message=message,
+        choices=choices,
+        initial_selection=_selection_ranges(choices, initial_selection),
+        **kwargs)
+
+
 def get_folder(initial_folder: str = '.', **kwargs) -> str:
     """
     Get folder interactively using a file dialog window.
@@ -354,6 +2943,260 @@ def get_filename(initial_folder: str = '.', **kwargs) -> str:
         **kwargs)
 
 
+def get_filenames(initial_folder: str = '.',
+                  patterns: Sequence[str] = ['*'],
+                  **kwargs) -> List[str]:
+    """
+    Get one or many file names interactively.
+
+    Unlike `get_filename`, which uses the operating system's file dialog,
+    this function shows a file list that appears immediately and can be
+    scrolled while large folders are still being read.
+
+    Parameters
+    ----------
+    initial_folder
+        Optional. The initial folder of the file list.
+    patterns
+        Optional. List of glob patterns of the files to list, e.g.,
+        ['*.c3d', '*.csv']. Folders are always listed. The user can change
+        these patterns in the dialog.
+    kwargs
+        Consult the module's help for additional parameters.
+
+    Returns
+    -------
+    List[str]
+        The full paths of the selected files. An empty list is returned if
+        the user cancelled.
+
+    """
+    return _launch_subprocess(
+        function='get_filenames',
+        initial_folder=initial_folder,
+        patterns=list(patterns),
+        listing_cache=_listing_cache_arguments(),
+        **kwargs)
+
+
+def _wizard_steps(steps: Sequence[dict]) -> list:
+    """
+    Return a copy of the steps of a wizard.
+
+    Raises
+    ------
+    ValueError
+        If there is no step, or if a step has no 'function' key.
+
+    """
+    steps = [dict(step) for step in steps]
+    if len(steps) == 0:
+        raise ValueError('A wizard needs at least one step.')
+    for index, step in enumerate(steps):
+        if 'function' not in step:
+            raise ValueError(f"Step {index} of the wizard has no 'function' "
+                             "key.")
+    return steps
+
+
+def wizard(steps: Sequence[dict], **kwargs) -> Union[list, int]:
+    """
+    Show a sequence of dialogs in a single window, with Back/Next buttons.
+
+    All steps are shown by the same process and window, which is faster
+    than calling the corresponding functions one after the other.
+
+    Parameters
+    ----------
+    steps
+        List of dict, one per step. Each dict has a 'function' key, which is
+        either 'message', 'button_dialog', 'input_dialog', 'get_folder' or
+        'get_filename', and may have the keys 'message', 'choices',
+        'labels', 'initial_values', 'masked' and 'initial_folder' as
+        accepted by this function. For example::
+
+            [{'function': 'get_folder', 'message': 'Select the data folder'},
+             {'function': 'button_dialog', 'message': 'Filter the data?',
+              'choices': ['Yes', 'No']}]
+
+        The 'get_folder' and 'get_filename' steps show an entry with a
+        browse button.
+    kwargs
+        Consult the module's help for additional parameters.
+
+    Returns
+    -------
+    list or int
+        A list with the answer of each step, as would be returned by the
+        corresponding function ('message' steps return None). If the user
+        closes the window instead of finishing the sequence, a value of -1
+        is returned.
+
+    """
+    return _launch_subprocess(
+        function='wizard',
+        steps=_wizard_steps(steps),
+        **kwargs)
+
+
+async def message_async(
+        message: str,
+        **kwargs) -> Union[MessageWindow, None]:
+    """
+    Show or close a non-blocking message window, from an asyncio coroutine.
+
+    Same as `message`, which never waits for the user. It is provided so
+    that all the dialog functions have a coroutine version.
+    """
+    return _show_message(message, **kwargs)
+
+
+async def button_dialog_async(
+        message: str = 'Please select an option',
+        choices: Sequence[str] = ['OK', 'Cancel'],
+        **kwargs) -> int:
+    """
+    Show a dialog window with a selection of buttons, from a coroutine.
+
+    Same as `button_dialog`, but awaiting the user's choice does not block
+    the running asyncio event loop. Cancelling the coroutine closes the
+    dialog window.
+    """
+    return await _launch_subprocess_async(
+        function='button_dialog',
+        message=message,
+        choices=choices,
+        **kwargs)
+
+
+async def preview_dialog_async(
+        image,
+        message: str = 'Please select an option',
+        choices: Sequence[str] = ['OK', 'Cancel'],
+        max_size: Sequence[int] = (800, 600),
+        **kwargs) -> int:
+    """
+    Show a dialog window with an image and buttons, from a coroutine.
+
+    Same as `preview_dialog`, but awaiting the user's choice does not block
+    the running asyncio event loop. Cancelling the coroutine closes the
+    dialog window.
+    """
+    arguments, block = _preview_arguments(image, max_size)
+    try:
+        return await _launch_subprocess_async(
+            function='preview_dialog',
+            message=message,
+            choices=choices,
+            **arguments,
+            **kwargs)
+    finally:
+        _release_preview(block)
+
+
+async def input_dialog_async(
+        message: str = '',
+        labels: Sequence[str] = [],
+        initial_values: Sequence[str] = [],
+        masked: Sequence[bool] = [],
+        **kwargs) -> Union[str, List[str]]:
+    """
+    Prompt the user with an input dialog, from a coroutine.
+
+    Same as `input_dialog`, but awaiting the user's input does not block
+    the running asyncio event loop. Cancelling the coroutine closes the
+    dialog window.
+    """
+    return await _launch_subprocess_async(
+        function='input_dialog',
+        message=message,
+        labels=labels,
+        initial_values=initial_values,
+        masked=masked,
+        **kwargs)
+
+
+async def checklist_dialog_async(
+        message: str = 'Please select the items',
+        choices: Sequence[str] = [],
+        initial_selection: Sequence[int] = [],
+        **kwargs) -> Union[array.array, int]:
+    """
+    Show a dialog window with a list of items to select, from a coroutine.
+
+    Same as `checklist_dialog`, but awaiting the user's selection does not
+    block the running asyncio event loop. Cancelling the coroutine closes
+    the dialog window.
+    """
+    return await _launch_subprocess_async(
+        function='checklist_dialog',
+        convert=_from_ranges,
+        message=message,
+        choices=choices,
+        initial_selection=_selection_ranges(choices, initial_selection),
+        **kwargs)
+
+
+async def get_folder_async(initial_folder: str = '.', **kwargs) -> str:
+    """
+    Get folder interactively using a file dialog window, from a coroutine.
+
+    Same as `get_folder`, but awaiting the user's selection does not block
+    the running asyncio event loop. Cancelling the coroutine closes the
+    dialog window.
+    """
+    return await _launch_subprocess_async(
+        function='get_folder',
+        initial_folder=initial_folder,
+        **kwargs)
+
+
+async def get_filename_async(initial_folder: str = '.', **kwargs) -> str:
+    """
+    Get file name interactively using a file dialog window, from a coroutine.
+
+    Same as `get_filename`, but awaiting the user's selection does not block
+    the running asyncio event loop. Cancelling the coroutine closes the
+    dialog window.
+    """
+    return await _launch_subprocess_async(
+        function='get_filename',
+        initial_folder=initial_folder,
+        **kwargs)
+
+
+async def get_filenames_async(initial_folder: str = '.',
+                              patterns: Sequence[str] = ['*'],
+                              **kwargs) -> List[str]:
+    """
+    Get one or many file names interactively, from a coroutine.
+
+    Same as `get_filenames`, but awaiting the user's selection does not block
+    the running asyncio event loop. Cancelling the coroutine closes the
+    dialog window.
+    """
+    return await _launch_subprocess_async(
+        function='get_filenames',
+        initial_folder=initial_folder,
+        patterns=list(patterns),
+        listing_cache=_listing_cache_arguments(),
+        **kwargs)
+
+
+async def wizard_async(steps: Sequence[dict], **kwargs) -> Union[list, int]:
+    """
+    Show a sequence of dialogs in a single window, from a coroutine.
+
+    Same as `wizard`, but awaiting the user's answers does not block the
+    running asyncio event loop. Cancelling the coroutine closes the dialog
+    window.
+    """
+    return await _launch_subprocess_async(
+        function='wizard',
+        steps=_wizard_steps(steps),
+        **kwargs)
+
+
 def run_tests():
     """Run interactive tests."""
     # Running this script launches the interactive test/demo."
@@ -428,8 +3271,45 @@ def run_tests():
                                ['Yes', 'No'], icon='question')
         assert choice == 0
 
+        answers = wizard([
+            {'function': 'message',
+             'message': 'This is a wizard. Click Next.'},
+            {'function': 'button_dialog',
+             'message': 'Click Second.',
+             'choices': ['First', 'Second']},
+            {'function': 'input_dialog',
+             'message': 'Go back, check that Second is selected,\n'
+                        'then come back here and enter "test".'},
+            {'function': 'get_folder',
+             'message': 'Browse for any folder, then click Finish.'}],
+            title='Wizard', icon='gear')
+        assert answers[0] is None
+        assert answers[1] == 1
+        assert answers[2] == 'test'
+        assert answers[3] != ''
+
         button_dialog('Test completed.', ['OK'])
 
 
+if 'LIMITEDINTERACTION_BACKEND' in os.environ:
+    try:
+        set_launch_mode(os.environ['LIMITEDINTERACTION_BACKEND'])
+    except ValueError as e:  # Don't make the package unimportable
+        import warnings
+        warnings.warn(f"Ignoring LIMITEDINTERACTION_BACKEND: {e} "
+                      f"Using the '{_launch_mode[0]}' launch mode.")
+
+
 def __dir__():
-    return ['message', 'input_dialog', 'button_dialog', 'get_folder', 'get_filename']
+    return ['message', 'MessageWindow', 'progress', 'ProgressWindow',
+            'input_dialog', 'button_dialog', 'get_folder', 'get_filename',
+            'set_launch_mode', 'message_async', 'input_dialog_async',
+            'button_dialog_async', 'get_folder_async', 'get_filename_async',
+            'wizard', 'wizard_async', 'add_trace_callback',
+            'remove_trace_callback', 'set_trace_file', 'queue_responses',
+            'checklist_dialog', 'checklist_dialog_async', 'get_filenames',
+            'get_filenames_async', 'set_listing_cache', 'register_event_loop',
+            'unregister_event_loop', 'set_answer_store', 'forget_answers',
+            'set_dialog_scheduler', 'start_broker', 'stop_broker',
+            'start_daemon', 'stop_daemon', 'preview_dialog',
+            'preview_dialog_async']
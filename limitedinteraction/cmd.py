@@ -24,6 +24,49 @@ process by limitedinteraction/__init__.py.
 Functions that return something print a json string with [returnval, contents] where
 returnval is '' for success or a string that represent an exception to raise (e.g.,
 'ModuleNotFoundError') by the module on error.
+
+When called with the 'server' function, the process stays alive and serves
+requests read as json lines on stdin, each request being a dict of arguments
+with an additional 'id' key. Each request is shown in its own Toplevel window
+and its result is written on stdout as a json line {'id': id, 'output':
+[returnval, contents]}. A request {'close': id} closes the window of a
+previous request, and a request {'update': id, ...} updates it (e.g., the
+text of a message window). The server quits when stdin is closed.
+
+When called for a single dialog with '-' instead of the json arguments,
+the arguments are read as the first line of stdin instead. This is used for
+arguments that are too long for the command line.
+
+When called for a single dialog, these 'close' and 'update' requests are
+read on stdin, and the dialog is closed when stdin is closed. This is how
+message windows, which stay open until closed, are controlled.
+
+The 'forkserver' function uses the same protocol, but instead of showing the
+windows itself, it forks a new process for each request.
+
+The 'daemon' function serves the same requests and responses, as json
+messages sent using multiprocessing.connection, to every client that
+connects to its 'address' with its 'authkey'. This is how dialogs raised on
+another computer are shown on this one. It quits when stdin is closed.
+
+Two additional arguments are accepted by every function, for benchmarking:
+
+- 'timing': if True, the output has a third element {'timing': {...}} with
+  the time.time() of each step of the dialog: 'start' and
+  'tkinter_imported' for the process, 'received', 'root_created',
+  'icon_loading', 'icon_loaded', 'window_created', 'placing', 'placed',
+  'shown', 'mapped', 'painted' and 'answered' for the request, and the
+  process' peak resident memory in kB as 'peak_rss_kb' (when available).
+- 'autorespond': answer the dialog with this value as soon as it is shown
+  and idle, as if the user answered immediately.
+
+The 'cascade' argument, given by the scheduler when other dialogs are
+open, is the number of the dialog's slot: the window is offset by this
+number of steps from its position.
+
+If the 'remember' argument is True, a "Remember my answer" check box is
+shown under the dialog, and if it is checked, the output has a third
+element {'remember': True} (merged with the 'timing' element if any).
 """
 
 __author__ = "Félix Chénier"
@@ -31,16 +74,87 @@ __copyright__ = "Copyright (C) 2020 Félix Chénier"
 __email__ = "chenier.felix@uqam.ca"
 __license__ = "Apache 2.0"
 
+def to_ranges(indices):
+    """
+    Return indices as a sorted list of [start, stop] ranges.
+
+    This is how checklist selections are exchanged with cmd.py. It is
+    defined outside the main block so that the parent process uses the same
+    implementation.
+    """
+    ranges = []
+    for index in sorted(set(indices)):
+        if len(ranges) > 0 and ranges[-1][1] == index:
+            ranges[-1][1] = index + 1
+        else:
+            ranges.append([index, index + 1])
+    return ranges
+
+
+# The functions that can be a step of a wizard.
+wizard_step_functions = ['message', 'button_dialog', 'input_dialog',
+                         'get_folder', 'get_filename']
+
+
+def input_fields(**kwargs):
+    """
+    Return the labels, initial_values and masked lists of an input.
+
+    Raise a ValueError if their lengths don't match. Like `to_ranges`, this
+    is also used by the parent process to validate the arguments in the
+    'headless' launch mode.
+    """
+    if 'labels' in kwargs:
+        labels = kwargs['labels']
+    else:
+        labels = []
+
+    if 'initial_values' in kwargs:
+        initial_values = kwargs['initial_values']
+    else:
+        initial_values = []
+
+    if 'masked' in kwargs:
+        masked = kwargs['masked']
+    else:
+        masked = []
+
+    n_boxes = max(1,
+                  len(labels),
+                  len(initial_values),
+                  len(masked))
+
+    if len(labels) == 0:
+        labels = [''] * n_boxes
+    if len(initial_values) == 0:
+        initial_values = [''] * n_boxes
+    if len(masked) == 0:
+        masked = [False] * n_boxes
+
+    if (
+            len(labels) != n_boxes or
+            len(initial_values) != n_boxes or
+            len(masked) != n_boxes):
+        raise ValueError("Length mismatch between labels, "
+                         "initial_values and masked.")
+
+    return (labels, initial_values, masked)
+
+
 #--- If only imported, do nothing.
 if __name__ == '__main__':
 
     #---- Main imports
+    import time
+    process_timing = {'start': time.time()}  # For the 'timing' argument
     import json
     import sys
     from functools import partial
-    import time
     import os
     import platform
+    import queue
+    import collections
+    from threading import Thread, Lock
 
 
     #---- Exception management
@@ -50,6 +164,15 @@ if __name__ == '__main__':
         sys.exit(0)
 
 
+    class ReturnedError(Exception):
+        """Error to be returned to the module as [exception_type, text]."""
+
+        def __init__(self, exception_type: str, exception_text: str):
+            super().__init__(exception_text)
+            self.exception_type = exception_type
+            self.exception_text = exception_text
+
+
     #---- Other imports
 
     # Try to import tkinter and gracefully fail if not available
@@ -67,6 +190,7 @@ if __name__ == '__main__':
                 "etc.) which normally includes tkinter and links correctly to the tk \n"
                 "GUI toolkit."))
 
+    process_timing['tkinter_imported'] = time.time()
 
     is_pc = True if platform.system() == 'Windows' else False
     is_mac = True if platform.system() == 'Darwin' else False
@@ -91,14 +215,22 @@ if __name__ == '__main__':
         return (width, height, left, top)
 
 
+    def record_time(root, step):
+        """Record the time of a step if the window's timing is recorded."""
+        timing = getattr(root, 'timing', None)
+        if timing is not None and step not in timing:
+            timing[step] = time.time()
+
+
     def place_window(root, **kwargs):
         """Place window in screen."""
+        record_time(root, 'placing')
         if 'left' in kwargs and 'right' in kwargs:
-            exit_and_raise('ValueError',
-                           "'left' and 'right' cannot be both specified.")
+            raise ReturnedError('ValueError',
+                                "'left' and 'right' cannot be both specified.")
         if 'top' in kwargs and 'bottom' in kwargs:
-            exit_and_raise('ValueError',
-                           "'top' and 'bottom' cannot be both specified.")
+            raise ReturnedError('ValueError',
+                                "'top' and 'bottom' cannot be both specified.")
 
         # Get current dimensions
         (contents_width, contents_height,
@@ -133,11 +265,32 @@ if __name__ == '__main__':
         else:
             win_top = int(root.winfo_screenheight() / 2 - win_height / 2)  # center
 
+        # Offset the windows shown while other dialogs are open, away from
+        # the screen edge they are placed against.
+        if kwargs.get('cascade', 0) > 0:
+            offset = 30 * kwargs['cascade']
+            win_left += -offset if 'right' in kwargs else offset
+            win_top += -offset if 'bottom' in kwargs else offset
+            win_left = max(0, min(
+                win_left, root.winfo_screenwidth() - win_width))
+            win_top = max(0, min(
+                win_top, root.winfo_screenheight() - win_height))
+
         # Window parameters to contents paramaters
         contents_width = win_width - 2 * frm_width
         contents_height = win_height - titlebar_height - frm_width
 
         root.geometry(f'{contents_width}x{contents_height}+{win_left}+{win_top}')
+        record_time(root, 'placed')
+
+
+    def fit_window(root, **kwargs):
+        """Enlarge and place the window again if its contents grew."""
+        root.update_idletasks()
+        if (root.winfo_reqwidth() > root.winfo_width() or
+                root.winfo_reqheight() > root.winfo_height()):
+            root.geometry('')
+            place_window(root, **kwargs)
 
 
     def show_window(root):
@@ -147,78 +300,193 @@ if __name__ == '__main__':
         root.attributes("-alpha", 1)
 
 
-    def button_dialog(root, frame, **kwargs):
-        """Terminate composing the GUI and run it."""
-        # We use a list of length 1 to pass selected_choice by reference.
-        selected_choice = [-1]  # Default if we click close.
-
-        def return_choice(ichoice):
-            selected_choice[0] = ichoice
-            root.quit()
-
-        # Buttons
-        buttons = []
-        ichoice = 0
-        for choice in kwargs['choices']:
-            btn = ttk.Button(frame,
-                             text=choice,
-                             command=partial(return_choice, ichoice))
-            btn.pack(fill=tk.X)
-            buttons.append(btn)
-            ichoice = ichoice + 1
-
-        buttons[0].focus()
-
+    # Number of choices above which they are shown in a list instead of
+    # buttons.
+    max_buttons = 15
+
+
+    def filtered_list(parent, choices, filtered, selectmode=tk.BROWSE):
+        """
+        Pack an entry and a Listbox of choices that it filters, in parent.
+
+        The choices are shown in a single Listbox, which only draws its
+        visible lines, so that it appears as fast for thousands of choices as
+        for a few. Typing in the entry filters the list, then calls filtered.
+        Return (entry, listbox, shown, flush_filter), where shown[0] holds the
+        indexes in choices of the listed items, and flush_filter applies the
+        filter immediately if the user is still typing.
+        """
+        lowered = [str(choice).lower() for choice in choices]
+        shown = [range(len(choices))]  # Indexes of the listed choices
+        pending_filter = [None]  # after id of the next filtering
+
+        filter_var = tk.StringVar()
+        entry = ttk.Entry(parent, textvariable=filter_var)
+        entry.pack(fill=tk.X)
+
+        list_frame = ttk.Frame(parent)
+        items_var = tk.Variable(value=tuple(choices))
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        listbox = tk.Listbox(
+            list_frame,
+            listvariable=items_var,
+            selectmode=selectmode,
+            height=max(1, min(max_buttons, len(choices))),
+            width=min(60, max([20] + [len(choice) for choice in lowered])),
+            exportselection=False,
+            activestyle='dotbox',
+            yscrollcommand=scrollbar.set)
+        scrollbar.configure(command=listbox.yview)
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        def apply_filter():
+            pending_filter[0] = None
+            text = filter_var.get().lower()
+            listbox.selection_clear(0, tk.END)
+            if text == '':
+                shown[0] = range(len(choices))
+                items_var.set(tuple(choices))
+            else:
+                shown[0] = [i for i, choice in enumerate(lowered)
+                            if text in choice]
+                items_var.set(tuple(choices[i] for i in shown[0]))
+            filtered()
+
+        def filter_changed(*args):
+            # Filter once the user pauses typing, not at every keystroke.
+            if pending_filter[0] is not None:
+                parent.after_cancel(pending_filter[0])
+            pending_filter[0] = parent.after(100, apply_filter)
+
+        def flush_filter():
+            if pending_filter[0] is not None:
+                parent.after_cancel(pending_filter[0])
+                apply_filter()
+
+        filter_var.trace_add('write', filter_changed)
+        return (entry, listbox, shown, flush_filter)
+
+
+    def choice_list(parent, choices, choose, selected=0):
+        """
+        Pack a searchable list of choices in parent and return its entry.
+
+        The arrow and page keys move the selection, and Return, double-click
+        or the OK button call choose with the index of the selected item in
+        choices (see `filtered_list`).
+        """
+        entry, listbox, shown, flush_filter = filtered_list(
+            parent, choices, lambda: select(0))
+
+        def select(position):
+            if len(shown[0]) == 0:
+                return
+            position = max(0, min(position, len(shown[0]) - 1))
+            listbox.selection_clear(0, tk.END)
+            listbox.selection_set(position)
+            listbox.activate(position)
+            listbox.see(position)
+
+        def move(delta):
+            selection = listbox.curselection()
+            select((selection[0] if len(selection) > 0 else -1) + delta)
+            return 'break'
+
+        def choose_selected(*args):
+            flush_filter()  # In case Return was pressed while typing
+            selection = listbox.curselection()
+            if len(selection) > 0:
+                choose(shown[0][selection[0]])
+
+        for widget in [entry, listbox]:
+            widget.bind('<Down>', lambda event: move(1))
+            widget.bind('<Up>', lambda event: move(-1))
+            widget.bind('<Next>', lambda event: move(max_buttons))
+            widget.bind('<Prior>', lambda event: move(-max_buttons))
+            widget.bind('<Return>', choose_selected)
+        listbox.bind('<Double-Button-1>', choose_selected)
+        ttk.Button(parent, text='OK', command=choose_selected).pack(
+            fill=tk.X)
+
+        select(selected)
+        return entry
+
+
+    def button_dialog(root, frame, done, **kwargs):
+        """Terminate composing the GUI and show it."""
+        if len(kwargs['choices']) > max_buttons:
+            # List of choices
+            choice_list(frame, kwargs['choices'], done).focus()
+        else:
+            # Buttons
+            buttons = []
+            ichoice = 0
+            for choice in kwargs['choices']:
+                btn = ttk.Button(frame,
+                                 text=choice,
+                                 command=partial(done, ichoice))
+                btn.pack(fill=tk.X)
+                buttons.append(btn)
+                ichoice = ichoice + 1
+
+            buttons[0].focus()
+
+        root.protocol('WM_DELETE_WINDOW', partial(done, -1))  # Closed
         place_window(root, **kwargs)
         show_window(root)
-        root.mainloop()
-        return selected_choice[0]
 
 
-    def input_dialog(root, frame, **kwargs):
-        """Terminate composing the GUI and run it."""
-        # Condition inputs
-        if 'labels' in kwargs:
-            labels = kwargs['labels']
-        else:
-            labels = []
+    def read_preview(**kwargs):
+        """
+        Return the PPM data of a preview image.
 
-        if 'initial_values' in kwargs:
-            initial_values = kwargs['initial_values']
-        else:
-            initial_values = []
+        The data is read from the shared memory block 'shared_memory' of
+        'image_size' bytes, which is left to the calling process to release,
+        or taken from 'image_data' in base64.
+        """
+        if 'shared_memory' not in kwargs:
+            return kwargs['image_data']
 
-        if 'masked' in kwargs:
-            masked = kwargs['masked']
-        else:
-            masked = []
+        from multiprocessing import shared_memory
+        try:
+            block = shared_memory.SharedMemory(kwargs['shared_memory'],
+                                               track=False)
+        except TypeError:  # Python < 3.13 always tracks the block
+            block = shared_memory.SharedMemory(kwargs['shared_memory'])
+            if os.name == 'posix':
+                # Else the resource tracker would unlink it when we quit.
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(block._name, 'shared_memory')
+        try:
+            return bytes(block.buf[0:kwargs['image_size']])
+        finally:
+            block.close()
 
-        n_boxes = max(1,
-                      len(labels),
-                      len(initial_values),
-                      len(masked))
 
-        if len(labels) == 0:
-            labels = [''] * n_boxes
-        if len(initial_values) == 0:
-            initial_values = [''] * n_boxes
-        if len(masked) == 0:
-            masked = [False] * n_boxes
+    def preview_dialog(root, frame, done, **kwargs):
+        """Add the preview image, then the message and the buttons."""
+        image = tk.PhotoImage(master=root, data=read_preview(**kwargs),
+                              format='PPM')
+        image_label = tk.Label(frame, image=image)
+        image_label.image = image  # Keep a reference
+        image_label.pack(pady=5)
+        button_dialog(root, frame, done, **kwargs)
 
-        if (
-                len(labels) != n_boxes or
-                len(initial_values) != n_boxes or
-                len(masked) != n_boxes):
-            exit_and_raise('ValueError', ("Length mismatch between labels, "
-                                          "initial_values and masked."))
 
-        outputs = [[]]
+    def input_dialog(root, frame, done, **kwargs):
+        """Terminate composing the GUI and show it."""
+        labels, initial_values, masked = input_fields(**kwargs)
+        n_boxes = len(labels)
 
         # OK callback
         def ok_pressed(*args):
-            for tk_entry in tk_entries:
-                outputs[0].append(tk_entry.get())
-            root.quit()
+            outputs = [tk_entry.get() for tk_entry in tk_entries]
+            if n_boxes == 1:  # Only one box, we return a str
+                done(outputs[0])
+            else:  # Multiple boxes, we return the full list of str
+                done(outputs)
 
         # Add labels and entries
         tk_labels = []
@@ -251,140 +519,1194 @@ if __name__ == '__main__':
         tk_ok_btn.bind('<Return>', ok_pressed)
         tk_ok_btn.pack(fill=tk.X)
 
+        root.protocol('WM_DELETE_WINDOW', partial(done, -1))  # Closed
         place_window(root, **kwargs)
         show_window(root)
-        root.mainloop()
 
-        if outputs == [[]]:  # Closed the window
-            return -1
-        elif n_boxes == 1:  # Only one box, we return a str
-            return outputs[0][0]
-        else:  # Multiple boxes, we return the full list of str
-            return outputs[0]
 
+    def checklist_dialog(root, frame, done, **kwargs):
+        """
+        Terminate composing the GUI and show it.
+
+        The choices are shown in a Listbox with extended selection
+        (shift-click selects a range, control-click toggles an item). The
+        selection is kept by index in choices, so that it is preserved when
+        the list is filtered. It is returned as a list of [start, stop]
+        ranges, which stays small for large contiguous selections.
+        """
+        choices = kwargs['choices']
+        selected = [False] * len(choices)
+        for start, stop in kwargs.get('initial_selection', []):
+            if not 0 <= start < stop <= len(choices):
+                raise ReturnedError(
+                    'ValueError',
+                    "initial_selection must only contain indexes of choices.")
+            selected[start:stop] = [True] * (stop - start)
+        entry, listbox, shown = filtered_list(
+            frame, choices, lambda: show_selection(),
+            selectmode=tk.EXTENDED)[0:3]
+
+        count_label = ttk.Label(frame)
+        count_label.configure(anchor="center")
+        count_label.pack(fill=tk.X)
+
+        def show_selection():
+            """Select the listed items that are selected, by range."""
+            listbox.selection_clear(0, tk.END)
+            for start, stop in to_ranges(
+                    [position for position, i in enumerate(shown[0])
+                     if selected[i]]):
+                listbox.selection_set(start, stop - 1)
+            count_label.configure(
+                text=f'{sum(selected)} of {len(choices)} selected')
+
+        def read_selection(*args):
+            """Update the selection from the listed items."""
+            for i in shown[0]:
+                selected[i] = False
+            for position in listbox.curselection():
+                selected[shown[0][position]] = True
+            count_label.configure(
+                text=f'{sum(selected)} of {len(choices)} selected')
+
+        def select_shown(value):
+            """Select or unselect every listed item."""
+            for i in shown[0]:
+                selected[i] = value
+            show_selection()
 
-    def message(root, frame, **kwargs):
-        """Terminate composing the GUI and draw until flagfile is deleted."""
+        def ok_pressed(*args):
+            done(to_ranges([i for i in range(len(choices)) if selected[i]]))
+
+        entry.bind('<Return>', ok_pressed)
+        listbox.bind('<<ListboxSelect>>', read_selection)
+        listbox.bind('<Return>', ok_pressed)
+
+        buttons_frame = ttk.Frame(frame)
+        ttk.Button(buttons_frame, text='Select all',
+                   command=partial(select_shown, True)).pack(
+                       side=tk.LEFT, expand=True, fill=tk.X)
+        ttk.Button(buttons_frame, text='Select none',
+                   command=partial(select_shown, False)).pack(
+                       side=tk.LEFT, expand=True, fill=tk.X)
+        buttons_frame.pack(fill=tk.X)
+        ttk.Button(frame, text='OK', command=ok_pressed,
+                   default='active').pack(fill=tk.X)
+
+        show_selection()
+        entry.focus()
+
+        root.protocol('WM_DELETE_WINDOW', partial(done, -1))  # Closed
         place_window(root, **kwargs)
         show_window(root)
 
-        def check_if_file_exists(file):
-            try:
-                fid = open(file, 'r')
-            except FileNotFoundError:
-                return False
-            fid.close()
-            return True
 
-        while check_if_file_exists(kwargs['flagfile']):
-            root.update()
-            time.sleep(0.2)
+    def update_message(root, frame, request, **kwargs):
+        """Update the message and icon of a window following a request."""
+        if 'message' in request:
+            frame.message_label.configure(text=request['message'])
+        if request.get('icon') is not None:
+            set_icon(root, frame, request['icon'])
+        fit_window(root, **kwargs)
+
+
+    def message(root, frame, done, **kwargs):
+        """
+        Terminate composing the GUI and show it until it is closed.
+
+        Return a control function that updates the message and icon.
+        """
+        root.protocol('WM_DELETE_WINDOW', partial(done, None))  # Closed
+        place_window(root, **kwargs)
+        show_window(root)
+
+        def control(request):
+            update_message(root, frame, request, **kwargs)
+
+        return control
+
+
+    def format_duration(seconds):
+        """Format a duration in seconds as H:MM:SS or M:SS."""
+        minutes, seconds = divmod(int(round(seconds)), 60)
+        hours, minutes = divmod(minutes, 60)
+        if hours > 0:
+            return f'{hours}:{minutes:02d}:{seconds:02d}'
+        else:
+            return f'{minutes}:{seconds:02d}'
+
+
+    def progress(root, frame, done, **kwargs):
+        """
+        Terminate composing the GUI and show it until it is closed.
+
+        Return a control function that updates the progress, message and
+        icon. The progress is updated using the 'value' and 'elapsed' keys
+        of the request, from which the throughput and the estimated
+        remaining time are calculated.
+        """
+        total = kwargs.get('total')
+        unit = kwargs.get('unit', '')
+
+        bar = ttk.Progressbar(
+            frame, orient=tk.HORIZONTAL, length=300,
+            mode='indeterminate' if total is None else 'determinate',
+            maximum=100 if total is None else max(total, 1e-9))
+        bar.pack(fill=tk.X)
+
+        readout = ttk.Label(frame, text='', padding=(0, 5))
+        readout.configure(anchor="center")  # center justified
+        readout.pack(fill=tk.X)
+
+        if total is None:
+            bar.start(20)  # Animate the indeterminate bar
+
+        root.protocol('WM_DELETE_WINDOW', partial(done, None))  # Closed
+        place_window(root, **kwargs)
+        show_window(root)
+
+        def control(request):
+            if 'value' in request:
+                value = request['value']
+                elapsed = request['elapsed']
+                rate = value / elapsed if elapsed > 0 else 0.0
+
+                if total is None:
+                    text = f'{value:g} {unit}'.strip()
+                else:
+                    bar.configure(value=min(value, total))
+                    text = f'{value:g}/{total:g} {unit}'.strip()
+                text += f' - {rate:.3g}' + (f' {unit}/s' if unit else '/s')
+                text += ' - '
+                text += format_duration(elapsed) + ' elapsed'
+                if total is not None and rate > 0 and value < total:
+                    text += (', ' + format_duration((total - value) / rate) +
+                             ' remaining')
+                readout.configure(text=text)
+
+            update_message(root, frame, request, **kwargs)
+
+        return control
 
 
-    def get_folder(root, **kwargs):
+    def get_folder(root, frame, done, **kwargs):
         root.withdraw()
         time.sleep(0.1)
         root.update()
         result = filedialog.askdirectory(
+            parent=root,
             title=kwargs['title'],
             initialdir=kwargs['initial_folder'])
         time.sleep(0.1)
         root.update()
-        return result
+        done(result)
 
 
-    def get_filename(root, **kwargs):
+    def get_filename(root, frame, done, **kwargs):
         root.withdraw()
         time.sleep(0.1)
         root.update()
         result = filedialog.askopenfilename(
+            parent=root,
             title=kwargs['title'],
             initialdir=kwargs['initial_folder'])
         time.sleep(0.1)
         root.update()
-        return result
+        done(result)
 
 
-    #--------------- ENTRY POINT ---------------#
-    kwargs = json.loads(sys.argv[1])
-    function = kwargs['function']
-    kwargs.pop('function')
+    # Folder listings cache, kept in memory for the life of this process
+    # (i.e., for the whole session in the 'server' launch mode), and
+    # optionally on disk for the other processes. folder -> (mtime, entries)
+    listing_cache = collections.OrderedDict()
+    listing_cache_size = [0]  # Number of entries in listing_cache
+
+
+    def listing_cache_file(cache, folder):
+        """Return the file of a folder listing in the on-disk cache."""
+        import hashlib
+        key = hashlib.sha1(folder.encode('utf-8', 'surrogateescape'))
+        return os.path.join(cache['folder'], key.hexdigest() + '.json')
+
+
+    def get_cached_listing(cache, folder, mtime):
+        """
+        Return the cached entries of a folder, or None.
 
-    #--- CREATE THE ROOT WINDOW ---#
-    if 'title' not in kwargs:
-        kwargs['title'] = ''
-    if 'message' not in kwargs:
-        kwargs['message'] = ''
-    if 'min_width' not in kwargs:
-        kwargs['min_width'] = 100
+        The cached entries are returned only if they were read when the
+        folder had this modification time, which changes whenever an entry
+        is added, removed or renamed.
+        """
+        if folder in listing_cache and listing_cache[folder][0] == mtime:
+            listing_cache.move_to_end(folder)  # Most recently used
+            return listing_cache[folder][1]
 
-    root = tk.Tk()
+        if cache.get('folder') is not None:
+            filename = listing_cache_file(cache, folder)
+            try:
+                with open(filename, 'r') as fid:
+                    data = json.load(fid)
+                if data['folder'] == folder and data['mtime'] == mtime:
+                    os.utime(filename)  # Most recently used
+                    entries = [tuple(entry) for entry in data['entries']]
+                    store_listing(cache, folder, mtime, entries,
+                                  on_disk=False)
+                    return entries
+            except (OSError, ValueError, KeyError):
+                pass  # Not cached, or unreadable cache file
+
+        return None
+
+
+    def store_listing(cache, folder, mtime, entries, on_disk=True):
+        """
+        Add the entries of a folder to the cache.
+
+        The least recently used listings are evicted so that the memory
+        cache holds at most cache['max_entries'] entries, and the disk cache
+        takes at most cache['max_disk_size'] bytes.
+        """
+        if folder in listing_cache:
+            listing_cache_size[0] -= len(listing_cache.pop(folder)[1])
+        if len(entries) <= cache['max_entries']:
+            listing_cache[folder] = (mtime, entries)
+            listing_cache_size[0] += len(entries)
+        while listing_cache_size[0] > cache['max_entries']:
+            listing_cache_size[0] -= len(listing_cache.popitem(last=False)[1][1])
+
+        if not on_disk or cache.get('folder') is None:
+            return
+        try:
+            os.makedirs(cache['folder'], exist_ok=True)
+            filename = listing_cache_file(cache, folder)
+            with open(filename + '.tmp', 'w') as fid:
+                json.dump({'folder': folder, 'mtime': mtime,
+                           'entries': entries}, fid)
+            os.replace(filename + '.tmp', filename)
+
+            files = [entry for entry in os.scandir(cache['folder'])
+                     if entry.name.endswith('.json')]
+            files.sort(key=lambda entry: entry.stat().st_mtime)
+            total_size = sum(entry.stat().st_size for entry in files)
+            while total_size > cache['max_disk_size'] and len(files) > 0:
+                total_size -= files[0].stat().st_size
+                os.remove(files.pop(0).path)
+        except OSError:
+            pass  # The cache is only an optimization
+
+
+    def scan_folder(folder):
+        """
+        Yield the (name, is_folder) entries of a folder, as they are read.
+
+        Entries whose type cannot be read (e.g., broken links) are yielded as
+        files.
+        """
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                try:
+                    is_folder = entry.is_dir()
+                except OSError:
+                    is_folder = False
+                yield (entry.name, is_folder)
+
+
+    def get_filenames(root, frame, done, **kwargs):
+        """
+        Terminate composing the GUI and show it.
+
+        The folder is read by slices of entries between Tk events, so that
+        the window appears immediately and can be scrolled while a large
+        folder is still being read. Once the folder is completely read, the
+        list is sorted with the subfolders first, and stored in the listing
+        cache (kwargs['listing_cache']) so that it is shown instantly the
+        next time, unless the folder was modified.
+        """
+        import fnmatch
+
+        entries = []  # (name, is_folder) of the folder, as read so far
+        shown = []  # Listed entries
+        folder = [os.path.abspath(kwargs['initial_folder'])]
+        patterns = [kwargs['patterns']]
+        reading = [None]  # Entries generator, None once the folder is read
+        folder_mtime = [None]  # Modification time of folder before reading
+        cache = kwargs['listing_cache']
+
+        def label(entry):
+            return entry[0] + os.sep if entry[1] else entry[0]
+
+        def matches(entry):
+            return entry[1] or any(fnmatch.fnmatch(entry[0], pattern)
+                                   for pattern in patterns[0])
+
+        def show_status():
+            n_files = sum(1 for entry in shown if not entry[1])
+            status_label.configure(
+                text=f'{n_files} files' +
+                (', reading the folder...' if reading[0] is not None else ''))
+
+        def read_slice():
+            if reading[0] is None:
+                return
+            new_entries = []
+            error = None
+            try:
+                for _ in range(1000):
+                    new_entries.append(next(reading[0]))
+            except StopIteration:
+                reading[0] = None
+            except OSError as e:
+                reading[0] = None
+                folder_mtime[0] = None  # Don't cache a partial listing
+                error = e
+
+            entries.extend(new_entries)
+            new_entries = [entry for entry in new_entries if matches(entry)]
+            shown.extend(new_entries)
+            if len(new_entries) > 0:
+                listbox.insert(tk.END, *[label(entry)
+                                         for entry in new_entries])
+
+            if reading[0] is None:  # Finished
+                entries.sort(key=lambda entry: (not entry[1],
+                                                entry[0].lower()))
+                if folder_mtime[0] is not None:
+                    store_listing(cache, folder[0], folder_mtime[0],
+                                  list(entries))
+                show_entries()
+                if error is not None:
+                    status_label.configure(text=str(error))
+            else:
+                show_status()
+                frame.after(1, read_slice)
+
+        def show_entries():
+            """List the entries that match the patterns, keeping selection."""
+            selection = set(shown[i] for i in listbox.curselection())
+            shown[:] = [entry for entry in entries if matches(entry)]
+            listbox.delete(0, tk.END)
+            listbox.insert(tk.END, *[label(entry) for entry in shown])
+            for i, entry in enumerate(shown):
+                if entry in selection:
+                    listbox.selection_set(i)
+            show_status()
+
+        def open_folder(new_folder):
+            new_folder = os.path.abspath(new_folder)
+            if not os.path.isdir(new_folder):
+                status_label.configure(text=f'{new_folder} is not a folder.')
+                return
+            if reading[0] is not None:
+                reading[0].close()  # Close the previous scandir
+            folder[0] = new_folder
+            folder_var.set(new_folder)
+            entries.clear()
+            shown.clear()
+            listbox.delete(0, tk.END)
+            try:
+                folder_mtime[0] = os.stat(new_folder).st_mtime_ns
+            except OSError:
+                folder_mtime[0] = None
+
+            cached = None
+            if folder_mtime[0] is not None:
+                cached = get_cached_listing(cache, new_folder,
+                                            folder_mtime[0])
+            if cached is not None:
+                reading[0] = None
+                entries.extend(cached)
+                show_entries()
+            else:
+                reading[0] = scan_folder(new_folder)
+                read_slice()
+
+        def set_patterns(*args):
+            patterns[0] = pattern_box.get().replace(';', ' ').split()
+            if len(patterns[0]) == 0:
+                patterns[0] = ['*']
+            show_entries()
+
+        def open_selected(*args):
+            selected = [shown[i] for i in listbox.curselection()]
+            if len(selected) == 1 and selected[0][1]:  # Only one folder
+                open_folder(os.path.join(folder[0], selected[0][0]))
+            elif len(selected) > 0:
+                done([os.path.join(folder[0], name)
+                      for name, is_folder in selected if not is_folder])
+
+        # Folder
+        folder_var = tk.StringVar()
+        folder_frame = ttk.Frame(frame)
+        ttk.Button(folder_frame, text='Up', width=4,
+                   command=lambda: open_folder(os.path.dirname(folder[0]))
+                   ).pack(side=tk.LEFT)
+        folder_entry = ttk.Entry(folder_frame, textvariable=folder_var)
+        folder_entry.bind('<Return>',
+                          lambda event: open_folder(folder_var.get()))
+        folder_entry.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        folder_frame.pack(fill=tk.X)
+
+        # Entries
+        list_frame = ttk.Frame(frame)
+        scrollbar = ttk.Scrollbar(list_frame, orient=tk.VERTICAL)
+        listbox = tk.Listbox(list_frame,
+                             selectmode=tk.EXTENDED,
+                             height=20,
+                             width=60,
+                             exportselection=False,
+                             activestyle='dotbox',
+                             yscrollcommand=scrollbar.set)
+        scrollbar.configure(command=listbox.yview)
+        listbox.bind('<Double-Button-1>', open_selected)
+        listbox.bind('<Return>', open_selected)
+        listbox.bind('<BackSpace>',
+                     lambda event: open_folder(os.path.dirname(folder[0])))
+        listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        list_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Patterns and status
+        pattern_values = [' '.join(patterns[0])]
+        if patterns[0] != ['*']:
+            pattern_values.append('*')
+        pattern_box = ttk.Combobox(frame, values=pattern_values)
+        pattern_box.set(pattern_values[0])
+        pattern_box.bind('<<ComboboxSelected>>', set_patterns)
+        pattern_box.bind('<Return>', set_patterns)
+        pattern_box.pack(fill=tk.X)
+        status_label = ttk.Label(frame)
+        status_label.configure(anchor="center")
+        status_label.pack(fill=tk.X)
+
+        ttk.Button(frame, text='Open', command=open_selected,
+                   default='active').pack(fill=tk.X)
+
+        listbox.focus()
+        root.protocol('WM_DELETE_WINDOW', partial(done, []))  # Closed
+        place_window(root, **kwargs)
+        show_window(root)
+        open_folder(folder[0])
+
+
+    def wizard(root, frame, done, **kwargs):
+        """
+        Compose a sequence of steps in the same window and show it.
+
+        Each step is shown in turn with Back and Next buttons. The answers
+        of every step are returned together once the last step is completed.
+        """
+        steps = kwargs['steps']
+        for step in steps:
+            if step.get('function') not in wizard_step_functions:
+                raise ReturnedError(
+                    'ValueError',
+                    f"Unknown wizard step function '{step.get('function')}'.")
+            if step['function'] == 'input_dialog':
+                input_fields(**step)  # Raises if arguments are invalid
+
+        answers = [None] * len(steps)
+        current = [0]  # Index of the current step
+        step_frame = [None]  # Frame of the current step
+        read_answer = [lambda: None]  # Reads the current step's answer
+
+        def go_next(*args):
+            answers[current[0]] = read_answer[0]()
+            if current[0] == len(steps) - 1:
+                done(answers)
+            else:
+                current[0] += 1
+                show_step()
+
+        def go_back(*args):
+            answers[current[0]] = read_answer[0]()
+            current[0] -= 1
+            show_step()
+
+        def choose(ichoice):
+            read_answer[0] = lambda: ichoice
+            go_next()
+
+        def browse(entry, step):
+            if step['function'] == 'get_folder':
+                ask = filedialog.askdirectory
+            else:
+                ask = filedialog.askopenfilename
+            result = ask(parent=root, title=step.get('title', ''),
+                         initialdir=step.get('initial_folder', '.'))
+            if result:
+                entry.delete(0, tk.END)
+                entry.insert(0, result)
+
+        nav_frame = ttk.Frame(frame)
+        back_btn = ttk.Button(nav_frame, text='< Back', command=go_back)
+        back_btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        next_btn = ttk.Button(nav_frame, text='Next >', command=go_next,
+                              default='active')
+        next_btn.pack(side=tk.LEFT, expand=True, fill=tk.X)
+        nav_frame.pack(fill=tk.X)
+
+        def show_step():
+            step = steps[current[0]]
+            answer = answers[current[0]]
+
+            if step_frame[0] is not None:
+                step_frame[0].destroy()
+            step_frame[0] = ttk.Frame(frame)
+            step_frame[0].pack(fill=tk.X, before=nav_frame)
+
+            lbl = ttk.Label(step_frame[0], text=step.get('message', ''),
+                            padding=(0, 5))
+            lbl.configure(anchor="center")  # center justified
+            lbl.pack(fill=tk.X)
+
+            if step['function'] == 'button_dialog':
+                choices = step.get('choices', ['OK', 'Cancel'])
+                if len(choices) > max_buttons:
+                    choice_list(step_frame[0], choices, choose,
+                                answer or 0).focus()
+                else:
+                    for ichoice, choice in enumerate(choices):
+                        btn = ttk.Button(step_frame[0], text=choice,
+                                         command=partial(choose, ichoice))
+                        btn.pack(fill=tk.X)
+                        if ichoice == (answer or 0):
+                            btn.focus()
+                read_answer[0] = lambda: answer
+
+            elif step['function'] == 'input_dialog':
+                labels, initial_values, masked = input_fields(**step)
+                if answer is not None:
+                    initial_values = [answer] if len(labels) == 1 else answer
+                entries = []
+                for i, label in enumerate(labels):
+                    if len(label) > 0:
+                        tk_label = ttk.Label(step_frame[0], text=label)
+                        tk_label.configure(anchor="center")
+                        tk_label.pack(fill=tk.X)
+                    entry = ttk.Entry(step_frame[0],
+                                      show='*' if masked[i] else '')
+                    entry.insert(0, initial_values[i])
+                    entry.bind('<Return>', go_next)
+                    entry.pack(fill=tk.X)
+                    entries.append(entry)
+                entries[0].focus()
+
+                def read_entries():
+                    values = [entry.get() for entry in entries]
+                    return values[0] if len(values) == 1 else values
+
+                read_answer[0] = read_entries
+
+            elif step['function'] in ['get_folder', 'get_filename']:
+                entry = ttk.Entry(step_frame[0])
+                entry.insert(0, answer or '')
+                entry.bind('<Return>', go_next)
+                entry.pack(fill=tk.X)
+                ttk.Button(step_frame[0], text='Browse...',
+                           command=partial(browse, entry, step)).pack(
+                               fill=tk.X)
+                entry.focus()
+                read_answer[0] = entry.get
+
+            else:  # message
+                next_btn.focus()
+                read_answer[0] = lambda: None
+
+            # Update the navigation buttons
+            back_btn.configure(
+                state=tk.NORMAL if current[0] > 0 else tk.DISABLED)
+            next_btn.configure(
+                text='Finish' if current[0] == len(steps) - 1 else 'Next >')
+            if step['function'] == 'button_dialog' and answer is None:
+                next_btn.configure(state=tk.DISABLED)  # Click a choice first
+            else:
+                next_btn.configure(state=tk.NORMAL)
 
-    # Make it transparent while we modify it.
-    root.wm_attributes("-alpha", 0)
-    root.attributes('-alpha', 0)
+            # Fit the window to the new contents
+            root.geometry('')
+            place_window(root, **kwargs)
 
-    # Ensure the window is not created as a tab on macOS
-    root.resizable(width=False, height=False)
-    root.title(kwargs['title'])
+        root.protocol('WM_DELETE_WINDOW', partial(done, -1))  # Closed
+        show_step()
+        show_window(root)
 
-    # Set topmost
-    root.attributes('-topmost', True)
 
-    # Disable resize button on windows
-    if is_pc:
-        root.attributes('-toolwindow', True)
+    # Icon files that are already loaded, as base64 str, by file name.
+    icon_data = {}  # type: dict
 
-    # Add the main frame
-    frame = ttk.Frame(root, padding=5)
-    frame.pack(fill=tk.X)
 
-    # Add the icon and set application icon
-    if 'icon' in kwargs and kwargs['icon'] is not None:
-        if kwargs['icon'] in ['alert', 'clock', 'cloud', 'error', 'find',
-                              'gear', 'info', 'light', 'lock', 'question',
-                              'warning']:
-            small_icon = my_path + f"/images/{kwargs['icon']}_small.png"
-            large_icon = my_path + f"/images/{kwargs['icon']}_large.png"
+    def photo_image(root, file):
+        """Create a PhotoImage from a file, or from its preloaded data."""
+        if file in icon_data:
+            return tk.PhotoImage(master=root, data=icon_data[file])
+        else:
+            return tk.PhotoImage(master=root, file=file)
+
+
+    functions = {
+        'button_dialog': button_dialog,
+        'preview_dialog': preview_dialog,
+        'input_dialog': input_dialog,
+        'checklist_dialog': checklist_dialog,
+        'message': message,
+        'progress': progress,
+        'get_folder': get_folder,
+        'get_filename': get_filename,
+        'get_filenames': get_filenames,
+        'wizard': wizard,
+    }
+
+
+    def set_icon(root, frame, icon):
+        """Set the icon of the main frame and the application icon."""
+        if icon in ['alert', 'clock', 'cloud', 'error', 'find',
+                    'gear', 'info', 'light', 'lock', 'question',
+                    'warning']:
+            small_icon = my_path + f"/images/{icon}_small.png"
+            large_icon = my_path + f"/images/{icon}_large.png"
 
         else:
-            if isinstance(kwargs['icon'], str):
-                small_icon = kwargs['icon']
-                large_icon = kwargs['icon']
-            elif isinstance(kwargs['icon'], list):
-                small_icon = kwargs['icon'][0]
-                large_icon = kwargs['icon'][1]
+            if isinstance(icon, str):
+                small_icon = icon
+                large_icon = icon
+            elif isinstance(icon, list):
+                small_icon = icon[0]
+                large_icon = icon[1]
             else:
                 small_icon = None
                 large_icon = None
 
-        # Add the icon to the main frame
+        # Add the icon to the main frame, over the message label
         try:
-            icon_image = tk.PhotoImage(file=small_icon)
-            icon = tk.Label(frame, image=icon_image)
-            icon.pack(fill=tk.X)
+            icon_image = photo_image(root, small_icon)
+            if frame.icon_label is None:
+                frame.icon_label = tk.Label(frame)
+                if frame.message_label is None:
+                    frame.icon_label.pack(fill=tk.X)
+                else:
+                    frame.icon_label.pack(fill=tk.X,
+                                          before=frame.message_label)
+            frame.icon_label.configure(image=icon_image)
+            frame.icon_label.image = icon_image  # Keep a reference
         except:
             pass
 
         # Set the application icon
-        root.iconphoto(False, tk.PhotoImage(file=large_icon))
+        root.iconphoto(False, photo_image(root, large_icon))
+
+
+    def create_window(root, **kwargs):
+        """
+        Compose the common part of a dialog window.
+
+        The window is composed in root, which is either the Tk root (when
+        called for a single dialog) or a Toplevel (when serving requests).
+        Return the main frame, which has the attributes icon_label,
+        message_label and remember_var (the BooleanVar of the "Remember my
+        answer" check box, or None).
+        """
+        # Make it transparent while we modify it.
+        root.wm_attributes("-alpha", 0)
+        root.attributes('-alpha', 0)
+
+        # Ensure the window is not created as a tab on macOS
+        root.resizable(width=False, height=False)
+        root.title(kwargs['title'])
+
+        # Set topmost
+        root.attributes('-topmost', True)
+
+        # Disable resize button on windows
+        if is_pc:
+            root.attributes('-toolwindow', True)
+
+        # Add the main frame
+        frame = ttk.Frame(root, padding=5)
+        frame.pack(fill=tk.X)
+
+        # Add the "remember" check box, under the main frame
+        frame.remember_var = None
+        if kwargs.get('remember', False):
+            frame.remember_var = tk.BooleanVar(root, value=False)
+            ttk.Checkbutton(root, text='Remember my answer',
+                            variable=frame.remember_var,
+                            padding=(5, 0, 5, 5)).pack(fill=tk.X)
+
+        # Add the icon and set application icon
+        frame.icon_label = None
+        frame.message_label = None
+        if 'icon' in kwargs and kwargs['icon'] is not None:
+            record_time(root, 'icon_loading')
+            set_icon(root, frame, kwargs['icon'])
+            record_time(root, 'icon_loaded')
+
+        # Add the message label
+        lbl = ttk.Label(frame, text=kwargs['message'], padding=(0, 5))
+        lbl.configure(anchor="center")  # center justified
+        lbl.pack(fill=tk.X)
+        frame.message_label = lbl
+
+        # Add the countdown
+        if kwargs.get('countdown') is not None:
+            show_countdown(frame, time.monotonic() + kwargs['countdown'])
+
+        return frame
+
+
+    def show_countdown(frame, deadline):
+        """
+        Show the time before the window is closed, updated every second.
+
+        The window is closed by the calling process at the deadline: this is
+        only a display.
+        """
+        lbl = ttk.Label(frame)
+        lbl.configure(anchor="center")  # center justified
+        lbl.pack(fill=tk.X)
+
+        def update():
+            if not lbl.winfo_exists():
+                return
+            remaining = max(0, int(deadline - time.monotonic() + 0.999))
+            lbl.configure(
+                text=f'This window will close in {remaining} s.')
+            if remaining > 0:
+                # Next update when the remaining seconds change
+                lbl.after(int(1000 * ((deadline - time.monotonic()) % 1)) + 1,
+                          update)
+
+        update()
+
+
+    def peak_rss_kb():
+        """Return the peak resident memory of this process in kB, or None."""
+        try:
+            import resource
+        except ImportError:  # Not available on Windows
+            return None
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak_rss // 1024 if is_mac else peak_rss  # Bytes on macOS
+
+
+    def run_dialog(root, function, done, received=None, **kwargs):
+        """
+        Compose and show the dialog of the requested function in root.
+
+        done is called with the function's result and a dict of additional
+        information once the user has answered (this dict is non-empty only
+        when the 'timing' argument is True, or when the user checked the
+        "Remember my answer" check box shown for the 'remember' argument, in
+        which case it has 'remember': True), received being the time at which
+        the request was received, before root was created. A ReturnedError
+        may be raised for invalid arguments. Return the dialog's control
+        function, which is called with each 'update' request received for
+        this dialog, or None.
+        """
+        info = {}
+        if kwargs.get('timing', False):
+            timing = dict(process_timing,
+                          received=received if received else time.time(),
+                          root_created=time.time())
+            info['timing'] = timing
+            root.timing = timing  # Also recorded by the window functions
+
+            def record_mapped(*args):
+                if 'mapped' not in timing:
+                    timing['mapped'] = time.time()
+
+            root.bind('<Map>', record_mapped, add='+')
+
+        def info_done(result):
+            if 'timing' in info:
+                timing['answered'] = time.time()
+                timing['peak_rss_kb'] = peak_rss_kb()
+            if frame.remember_var is not None and frame.remember_var.get():
+                info['remember'] = True
+            done(result, info)
+
+        if 'title' not in kwargs:
+            kwargs['title'] = ''
+        if 'message' not in kwargs:
+            kwargs['message'] = ''
+        if 'min_width' not in kwargs:
+            kwargs['min_width'] = 100
+
+        if function not in functions:
+            raise ReturnedError('ValueError',
+                                f"Unknown function '{function}'.")
+
+        frame = create_window(root, **kwargs)
+        if 'timing' in info:
+            timing['window_created'] = time.time()
+
+        control = functions[function](root, frame, info_done, **kwargs)
+        if 'timing' in info:
+            timing['shown'] = time.time()
+
+            def record_painted():
+                timing['painted'] = time.time()
+
+            root.after_idle(record_painted)
+
+        if 'autorespond' in kwargs:
+            root.after_idle(info_done, kwargs['autorespond'])
+
+        return control
+
+
+    def dialog_output(result, info):
+        """Return the output of a dialog, as printed by cmd.py."""
+        if len(info) > 0:
+            return ['', result, info]
+        else:
+            return ['', result]
+
+
+    def write_response(response):
+        """Write a response of the server on stdout."""
+        sys.stdout.write(json.dumps(response) + '\n')
+        sys.stdout.flush()
+
+
+    def serve(root, listener=None, authkey=None):
+        """
+        Serve the requests read on stdin until stdin is closed.
+
+        If listener is a multiprocessing.connection.Listener, the requests
+        are instead received as json messages from every connection that it
+        accepts and that authenticates with authkey, each connection having
+        its own request ids. The windows of a lost connection are closed,
+        and stdin is only watched to quit when it is closed.
+        """
+        requests = queue.Queue()  # type: queue.Queue  # (client, request)
+        windows = {}  # type: dict  # (Window, control), by (client, id)
+
+        def read_requests(client, received):
+            for request in received:
+                requests.put((client, request))
+            requests.put((client, None))  # Lost client
+
+        def read_stdin():
+            for line in sys.stdin:
+                if listener is None:
+                    requests.put((write_response, json.loads(line)))
+            requests.put((None, None))  # stdin was closed
+
+        def receive(connection):
+            while True:
+                try:
+                    # Never unpickle: only json can come from the network.
+                    yield json.loads(connection.recv_bytes().decode())
+                except (EOFError, OSError, ValueError):
+                    connection.close()
+                    return
+
+        def authenticate(connection):
+            # In the connection's own thread, so that a silent client
+            # doesn't block the other ones.
+            from multiprocessing.connection import (
+                deliver_challenge, answer_challenge)
+            try:
+                deliver_challenge(connection, authkey)
+                answer_challenge(connection, authkey)
+            except Exception:  # Failed authentication or lost client
+                connection.close()
+                return
+
+            send_lock = Lock()
+
+            def send(response):
+                with send_lock:
+                    try:
+                        connection.send_bytes(json.dumps(response).encode())
+                    except OSError:  # Lost client
+                        pass
+
+            read_requests(send, receive(connection))
+
+        def accept():
+            while True:
+                try:
+                    connection = listener.accept()
+                except OSError:
+                    return
+                Thread(target=authenticate, args=(connection,),
+                       daemon=True).start()
+
+        def respond(key, window, output):
+            if not window.winfo_exists():
+                return  # Already responded
+            windows.pop(key, None)
+            window.destroy()
+            key[0]({'id': key[1], 'output': output})
+
+        def process_requests():
+            while True:
+                try:
+                    client, request = requests.get_nowait()
+                except queue.Empty:
+                    break
+                if client is None:
+                    root.quit()
+                    return
+
+                if request is None:
+                    for key in [key for key in windows if key[0] is client]:
+                        windows.pop(key)[0].destroy()
+                    continue
+
+                if 'close' in request:
+                    key = (client, request['close'])
+                    if key in windows:
+                        respond(key, windows[key][0], ['', None])
+                    continue
+
+                if 'update' in request:
+                    key = (client, request['update'])
+                    if key in windows and windows[key][1] is not None:
+                        windows[key][1](request)
+                    continue
+
+                received = time.time()
+                key = (client, request.pop('id'))
+                function = request.pop('function')
+                window = tk.Toplevel(root)
+                windows[key] = (window, None)
+                try:
+                    control = run_dialog(
+                        window, function,
+                        lambda result, info, key=key, window=window:
+                        respond(key, window, dialog_output(result, info)),
+                        received=received, **request)
+                    if window.winfo_exists():  # Not already done
+                        windows[key] = (window, control)
+                except ReturnedError as e:
+                    respond(key, window, [e.exception_type, e.exception_text])
+                except Exception as e:  # Don't let the server die
+                    respond(key, window, [type(e).__name__, str(e)])
+
+            root.after(20, process_requests)
+
+        Thread(target=read_stdin, daemon=True).start()
+        if listener is not None:
+            Thread(target=accept, daemon=True).start()
+        process_requests()
+        root.mainloop()
+
+
+    def daemon(address=None, authkey=None):
+        """
+        Serve the dialogs requested over a socket, until stdin is closed.
+
+        The address is a UNIX socket path or a [host, port] list, and the
+        authkey is in hexadecimal. The address that is actually listened on
+        (e.g., with the port chosen by the system for port 0) is printed as
+        a json line once the daemon is ready.
+        """
+        from multiprocessing.connection import Listener
+
+        if isinstance(address, list):
+            address = tuple(address)
+        try:
+            # Authenticated by serve, in the thread of each connection.
+            listener = Listener(address)
+        except OSError as e:
+            exit_and_raise('RuntimeError', f'Cannot listen on {address}: {e}')
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:  # E.g., no display
+            listener.close()
+            exit_and_raise('RuntimeError', f'Cannot show the dialogs: {e}')
+        root.withdraw()
+        write_response({'address': listener.address})
+        try:
+            serve(root, listener, bytes.fromhex(authkey))
+        finally:
+            listener.close()
 
-    # Add the message label
-    lbl = ttk.Label(frame, text=kwargs['message'], padding=(0, 5))
-    lbl.configure(anchor="center")  # center justified
-    lbl.pack(fill=tk.X)
+
+    def run_single(function, **kwargs):
+        """Show a single dialog in a new Tk root and print its output."""
+        received = time.time()
+        try:
+            root = tk.Tk()
+        except tk.TclError as e:  # E.g., no display
+            exit_and_raise('RuntimeError', f'Cannot show the dialog: {e}')
+
+        # We use a list of length 1 to pass the result by reference.
+        output = [None]
+
+        def done(result, info):
+            if output[0] is None:
+                output[0] = dialog_output(result, info)
+                root.quit()
+
+        controls = queue.Queue()
+
+        def read_controls():
+            for line in sys.stdin:
+                controls.put(json.loads(line))
+            controls.put({'close': True})  # stdin was closed
+
+        def process_controls(control):
+            while True:
+                try:
+                    request = controls.get_nowait()
+                except queue.Empty:
+                    break
+                if 'close' in request:
+                    done(None, {})
+                    return
+                if 'update' in request and control is not None:
+                    control(request)
+            root.after(20, process_controls, control)
+
+        try:
+            control = run_dialog(root, function, done, received=received,
+                                 **kwargs)
+            if output[0] is None:  # Not already done (e.g., file dialogs)
+                if sys.stdin is not None:
+                    Thread(target=read_controls, daemon=True).start()
+                    process_controls(control)
+                root.mainloop()
+        except ReturnedError as e:
+            output[0] = [e.exception_type, e.exception_text]
+        except ValueError as e:  # E.g., from input_fields
+            output[0] = ['ValueError', str(e)]
+
+        print(json.dumps(output[0]))
+
+
+    def forkserver():
+        """
+        Fork a new process for each request read on stdin.
+
+        This template process never creates a Tk root: it only has tkinter
+        and the icons loaded, so that each forked process starts directly at
+        the creation of its Tk root. The forked processes write their output
+        to a pipe that is forwarded on stdout with the request id, so that a
+        process that crashes only fails its own request. The 'update'
+        requests are forwarded to the stdin of the forked process.
+        """
+        import selectors
+        import signal
+        import base64
+
+        for file in os.listdir(my_path + '/images'):
+            with open(my_path + '/images/' + file, 'rb') as fid:
+                icon_data[my_path + '/images/' + file] = (
+                    base64.b64encode(fid.read()).decode())
+
+        signal.signal(signal.SIGCHLD, signal.SIG_IGN)  # Don't keep zombies
+        sys.stdout.flush()
+
+        selector = selectors.DefaultSelector()
+        selector.register(sys.stdin.fileno(), selectors.EVENT_READ, None)
+        stdin_buffer = b''
+        outputs = {}  # type: dict  # Pipe file descriptor -> (id, bytes)
+        pids = {}  # type: dict  # Request id -> forked process id
+        control_fds = {}  # type: dict  # Request id -> forked process' stdin
+
+        def respond(request_id, output):
+            sys.stdout.write(json.dumps({'id': request_id,
+                                         'output': output}) + '\n')
+            sys.stdout.flush()
+
+        def fork(request):
+            request_id = request.pop('id')
+            read_fd, write_fd = os.pipe()
+            control_read_fd, control_write_fd = os.pipe()
+            pid = os.fork()
+            if pid == 0:  # Forked process
+                try:
+                    signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                    selector.close()
+                    os.close(read_fd)
+                    os.close(control_write_fd)
+                    for fd in control_fds.values():
+                        os.close(fd)
+                    os.dup2(control_read_fd, 0)
+                    os.dup2(write_fd, 1)
+                    run_single(**request)
+                    sys.stdout.flush()
+                finally:
+                    os._exit(0)
+
+            os.close(write_fd)
+            os.close(control_read_fd)
+            control_fds[request_id] = control_write_fd
+            pids[request_id] = pid
+            outputs[read_fd] = (request_id, b'')
+            selector.register(read_fd, selectors.EVENT_READ, None)
+
+        while True:
+            for key, _ in selector.select():
+                fd = key.fd
+                data = os.read(fd, 65536)
+
+                if fd == sys.stdin.fileno():
+                    if data == b'':  # stdin was closed
+                        return
+                    stdin_buffer += data
+                    while b'\n' in stdin_buffer:
+                        line, stdin_buffer = stdin_buffer.split(b'\n', 1)
+                        request = json.loads(line.decode())
+                        if 'update' in request:
+                            if request['update'] in control_fds:
+                                try:
+                                    os.write(control_fds[request['update']],
+                                             line + b'\n')
+                                except OSError:
+                                    pass  # Already finished
+                        elif 'close' not in request:
+                            fork(request)
+                        elif request['close'] in pids:
+                            try:
+                                os.kill(pids[request['close']], signal.SIGTERM)
+                            except OSError:
+                                pass  # Already finished
+
+                elif data != b'':
+                    outputs[fd] = (outputs[fd][0], outputs[fd][1] + data)
+
+                else:  # The forked process finished
+                    selector.unregister(fd)
+                    os.close(fd)
+                    request_id, output = outputs.pop(fd)
+                    pids.pop(request_id, None)
+                    os.close(control_fds.pop(request_id))
+                    if output.strip() != b'':
+                        respond(request_id, json.loads(output.decode()))
+                    else:
+                        respond(request_id, [
+                            'RuntimeError',
+                            'The dialog process stopped unexpectedly.'])
+
+
+    #--------------- ENTRY POINT ---------------#
+    if sys.argv[1] == '-':  # Arguments too long for the command line
+        kwargs = json.loads(sys.stdin.readline())
+    else:
+        kwargs = json.loads(sys.argv[1])
+    function = kwargs['function']
+    kwargs.pop('function')
 
     #---- Pass the rest to the requested function and return
 
     if function == 'import':
+        root = tk.Tk()
         print(json.dumps(['', '']))
-    elif function == 'button_dialog':
-        print(json.dumps(['', button_dialog(root, frame, **kwargs)]))
-    elif function == 'input_dialog':
-        print(json.dumps(['', input_dialog(root, frame, **kwargs)]))
-    elif function == 'message':
-        message(root, frame, **kwargs)
-    elif function == 'get_filename':
-        print(json.dumps(['', get_filename(root, **kwargs)]))
-    elif function == 'get_folder':
-        print(json.dumps(['', get_folder(root, **kwargs)]))
+
+    elif function == 'server':
+        root = tk.Tk()
+        root.withdraw()
+        serve(root)
+
+    elif function == 'forkserver':
+        forkserver()
+
+    elif function == 'daemon':
+        daemon(**kwargs)
+
+    else:
+        run_single(function, **kwargs)
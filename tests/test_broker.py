@@ -0,0 +1,108 @@
+"""
+Tests of the dialog broker that run without any display.
+
+The broker is started in this process, with a scheduler that never shows
+a dialog (max_dialogs=0), and the workers are new python processes that
+find it in their environment.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+import limitedinteraction as li
+
+
+@pytest.fixture(autouse=True)
+def broker():
+    """Start a broker whose dialogs wait forever for the scheduler."""
+    li.set_launch_mode('subprocess')
+    li.set_dialog_scheduler(max_dialogs=0)
+    li.start_broker()
+    yield li._broker['server']
+    li.stop_broker()
+    li.set_dialog_scheduler()
+
+
+def start_worker(question: str, **kwargs):
+    """Start a worker that prints its answer to a button_dialog."""
+    code = ('import limitedinteraction as li\n'
+            f'print(li.button_dialog({question!r}, ["A", "B"], '
+            f'default=-2, **{kwargs!r}))\n')
+    package_folder = os.path.dirname(os.path.dirname(li.__file__))
+    env = dict(os.environ, PYTHONPATH=package_folder)
+    return subprocess.Popen([sys.executable, '-c', code], env=env,
+                            stdout=subprocess.PIPE)
+
+
+def wait_until(condition, timeout: float = 20):
+    """Wait until condition() is true, or fail."""
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+
+
+def queued() -> list:
+    """Return the priorities of the dialogs that wait for the scheduler."""
+    with li._scheduler['lock']:
+        return [-entry[0] for entry in li._scheduler['queue']
+                if not entry[2].cancelled()]
+
+
+def waiters(broker) -> list:
+    """Return the number of workers waiting for each pending dialog."""
+    with broker.lock:
+        return [len(pending[1]) for pending in broker.pending.values()]
+
+
+def test_priority(broker):
+    worker = start_worker('Continue?', priority=5)
+    try:
+        wait_until(lambda: len(queued()) == 1)
+        assert queued() == [5]
+    finally:
+        worker.kill()
+        worker.wait()
+    # The dialog of a lost worker is closed.
+    wait_until(lambda: queued() == [])
+    assert waiters(broker) == []
+
+
+def test_deduplication_and_fan_out(broker):
+    workers = [start_worker('Same question?', timeout=30) for i in range(2)]
+    other = start_worker('Other question?', timeout=30)
+    try:
+        wait_until(lambda: sorted(waiters(broker)) == [1, 2])
+        assert queued() == [0, 0]
+
+        with broker.lock:
+            future = [pending[0] for pending in broker.pending.values()
+                      if len(pending[1]) == 2][0]
+        li._set_result(future, ['', 1])  # As if the user clicked B
+        for worker in workers:
+            assert worker.communicate(timeout=20)[0].strip() == b'1'
+        assert waiters(broker) == [1]
+    finally:
+        for worker in workers + [other]:
+            worker.kill()
+            worker.wait()
+
+
+def test_leave(broker):
+    impatient = start_worker('Same question?', timeout=3)
+    patient = start_worker('Same question?', timeout=30)
+    try:
+        wait_until(lambda: waiters(broker) == [2])
+        # The impatient worker leaves, the dialog stays for the other one.
+        assert impatient.communicate(timeout=20)[0].strip() == b'-2'
+        wait_until(lambda: waiters(broker) == [1])
+        assert queued() == [0]
+    finally:
+        patient.kill()
+        patient.wait()
+    wait_until(lambda: queued() == [])
+    assert waiters(broker) == []
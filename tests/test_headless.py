@@ -0,0 +1,222 @@
+"""
+Tests of Limited Interaction that run without any display.
+
+The dialogs are answered in the 'headless' launch mode, and the timeouts
+are tested on dialogs that wait forever for the scheduler (max_dialogs=0),
+so that no dialog process is ever started.
+"""
+
+import asyncio
+import base64
+import json
+import os
+import time
+from array import array
+
+import pytest
+
+import limitedinteraction as li
+
+
+@pytest.fixture(autouse=True)
+def headless(tmp_path, monkeypatch):
+    """Start each test in headless mode, with a fresh temporary folder."""
+    monkeypatch.setitem(li._constants, 'temp_folder', str(tmp_path))
+    monkeypatch.setitem(li._answer_store, 'answers', None)
+    li._headless_responses.clear()
+    li._headless_file_read[0] = True
+    li.set_launch_mode('headless')
+    yield
+    li._headless_responses.clear()
+    li.set_dialog_scheduler()
+    li.set_answer_store()
+    li.set_launch_mode('subprocess')
+
+
+@pytest.fixture
+def never_shown():
+    """Make every dialog wait forever for the scheduler."""
+    li.set_launch_mode('subprocess')
+    li.set_dialog_scheduler(max_dialogs=0)
+
+
+def test_default_answers():
+    assert li.button_dialog('Continue?', ['Yes', 'No']) == 0
+    assert li.input_dialog('Name?', initial_values=['Bob']) == 'Bob'
+    assert li.input_dialog(labels=['a', 'b']) == ['', '']
+    assert li.checklist_dialog(choices=['a', 'b', 'c'],
+                               initial_selection=[0, 2]) == array('i', [0, 2])
+    assert li.get_folder('.') == os.path.abspath('.')
+    assert li.get_filename() == ''
+    assert li.get_filenames() == []
+    assert li.wizard([{'function': 'message'},
+                      {'function': 'button_dialog', 'choices': ['A', 'B']},
+                      {'function': 'input_dialog',
+                       'initial_values': ['x']}]) == [None, 0, 'x']
+
+
+def test_explicit_default():
+    assert li.button_dialog('Continue?', ['Yes', 'No'], default=1) == 1
+    assert li.checklist_dialog(choices=['a', 'b'],
+                               default=[1]) == array('i', [1])
+
+
+def test_queued_answers():
+    li.queue_responses([1, 'abc', [0, 2], -1, ['f1', 'f2']])
+    assert li.button_dialog('Continue?', ['Yes', 'No']) == 1
+    assert li.input_dialog('Name?') == 'abc'
+    assert li.checklist_dialog(choices=['a', 'b', 'c']) == array('i', [0, 2])
+    assert li.button_dialog('Continue?', ['Yes', 'No']) == -1
+    assert li.get_filenames() == ['f1', 'f2']
+    assert li.button_dialog('Continue?', ['Yes', 'No']) == 0  # Empty queue
+
+
+def test_responses_file(tmp_path, monkeypatch):
+    filename = tmp_path / 'responses.json'
+    filename.write_text(json.dumps([1, 'typed']))
+    monkeypatch.setenv('LIMITEDINTERACTION_RESPONSES', str(filename))
+    li._headless_file_read[0] = False
+    assert li.button_dialog('Continue?', ['Yes', 'No']) == 1
+    assert li.input_dialog('Name?') == 'typed'
+
+
+@pytest.mark.parametrize('function, kwargs, answer', [
+    (li.button_dialog, {'choices': ['a', 'b']}, 'abc'),
+    (li.button_dialog, {'choices': ['a', 'b']}, 2),
+    (li.button_dialog, {'choices': ['a', 'b']}, True),
+    (li.input_dialog, {'labels': ['a', 'b']}, 'abc'),
+    (li.input_dialog, {'labels': ['a', 'b']}, ['abc']),
+    (li.checklist_dialog, {'choices': ['a', 'b']}, [5]),
+    (li.checklist_dialog, {'choices': ['a', 'b']}, [-1]),
+    (li.get_filename, {}, 3),
+    (li.wizard, {'steps': [{'function': 'button_dialog'}]}, [0, 1]),
+    (li.wizard, {'steps': [{'function': 'button_dialog'}]}, ['abc']),
+])
+def test_invalid_queued_answers(function, kwargs, answer):
+    li.queue_responses([answer])
+    with pytest.raises(ValueError):
+        function(**kwargs)
+
+
+def test_timeout_blocking(never_shown):
+    start = time.monotonic()
+    assert li.button_dialog('Continue?', timeout=0.2) == -1
+    assert 0.2 <= time.monotonic() - start < 2
+    assert li.input_dialog('Name?', timeout=0.1, default='none') == 'none'
+    assert li.get_filenames(timeout=0.1) == []
+
+
+def test_timeout_default_not_shared(never_shown):
+    filenames = li.get_filenames(timeout=0.05)
+    filenames.append('x')
+    assert li.get_filenames(timeout=0.05) == []
+
+
+def test_timeout_non_blocking(never_shown):
+    future = li.button_dialog('Continue?', timeout=0.1, default=3,
+                              blocking=False)
+    assert future.result(timeout=2) == 3
+
+
+def test_timeout_async(never_shown):
+    assert asyncio.run(li.button_dialog_async(
+        'Continue?', timeout=0.1, default=5)) == 5
+
+
+def test_cancel_queued_dialog(never_shown):
+    future = li.button_dialog('Continue?', blocking=False)
+    assert future.cancel()
+    assert li._scheduler['slots'] == set()
+
+
+def test_remembered_answer_shows_no_window(never_shown):
+    key = li._answer_key({'function': 'button_dialog',
+                          'message': 'Overwrite?',
+                          'choices': ['Yes', 'No']}, 'overwrite')
+    li._remember_answer(key, 1)
+    # If a window was needed, the timeout would return 'shown'.
+    assert li.button_dialog('Overwrite?', ['Yes', 'No'], remember='overwrite',
+                            timeout=0.1, default='shown') == 1
+    assert li.button_dialog('Overwrite?', ['Yes', 'No'], remember='other',
+                            timeout=0.1, default='shown') == 'shown'
+    assert li.button_dialog('Overwrite?', ['Yes', 'No'], remember='overwrite',
+                            blocking=False).result(timeout=2) == 1
+
+
+def test_answer_store_persistence():
+    key = li._answer_key({'function': 'input_dialog', 'message': 'Name?'},
+                         'name')
+    li._remember_answer(key, 'Bob')
+    li._answer_store['answers'] = None  # As in a new session
+    assert li._recall_answer(key) == (True, 'Bob')
+    li.forget_answers()
+    assert li._recall_answer(key) == (False, None)
+    li._answer_store['answers'] = None
+    assert li._recall_answer(key) == (False, None)
+
+
+def test_answer_store_limits():
+    li.set_answer_store(max_entries=2)
+    keys = [li._answer_key({'function': 'button_dialog', 'message': str(i)},
+                           'key') for i in range(3)]
+    for answer, key in enumerate(keys):
+        li._remember_answer(key, answer)
+    assert li._recall_answer(keys[0]) == (False, None)
+    assert li._recall_answer(keys[2]) == (True, 2)
+
+    li.set_answer_store(max_age=0.05)
+    time.sleep(0.1)
+    assert li._recall_answer(keys[2]) == (False, None)
+
+
+def test_remember_masked_input(never_shown):
+    with pytest.raises(ValueError):
+        li.input_dialog('Password?', masked=[True], remember='password')
+
+
+@pytest.mark.parametrize('initial_selection', [[3], [-1], [0, 'a'], [True]])
+def test_checklist_invalid_initial_selection(initial_selection):
+    with pytest.raises(ValueError):
+        li.checklist_dialog(choices=['a', 'b', 'c'],
+                            initial_selection=initial_selection)
+
+
+def test_checklist_initial_selection_default():
+    assert list(li.checklist_dialog(
+        choices=['a', 'b', 'c', 'd'],
+        initial_selection=[3, 0, 1, 1])) == [0, 1, 3]
+
+
+def test_preview_invalid_max_size():
+    with pytest.raises(ValueError):
+        li.preview_dialog([[0.0]], max_size=(0, 600))
+
+
+@pytest.mark.parametrize('function', [li.get_folder, li.get_filename])
+def test_remember_file_dialog(never_shown, function):
+    with pytest.raises(ValueError):
+        function(remember='data')
+
+
+@pytest.mark.parametrize('steps', [
+    [], [{'message': 'Hello'}], [{'function': 'get_filenames'}],
+    [{'function': 'checklist_dialog', 'choices': ['a']}],
+    [{'function': 'input_dialog', 'labels': ['a', 'b'],
+      'initial_values': ['c']}]])
+def test_wizard_invalid_steps(steps):
+    with pytest.raises(ValueError):
+        li.wizard(steps)
+
+
+def test_preview_figure(never_shown):
+    figure = pytest.importorskip('matplotlib.figure')
+    fig = figure.Figure(figsize=(2, 1), dpi=100)  # Without pyplot
+    arguments, block = li._preview_arguments(fig, (100, 100))
+    try:
+        if block is not None:
+            data = bytes(block.buf)
+        else:  # No shared memory on this system
+            data = base64.b64decode(arguments['image_data'])
+        assert data.startswith(b'P6 100 50 255\n')
+    finally:
+        li._release_preview(block)